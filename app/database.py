@@ -1,17 +1,85 @@
 """
 数据库连接与操作模块 - 性能优化版
 """
+import uuid
 import pymysql
+import pymysql.connections
+from pymysql.constants import CLIENT
 import sqlalchemy
 from sqlalchemy import create_engine, text, event
 from sqlalchemy.pool import QueuePool
 from urllib.parse import quote
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
 from contextlib import contextmanager
 
 from app.config import AppConfig
 
 
+# ==================== LOAD DATA LOCAL INFILE 内存数据流 ====================
+# PyMySQL 收到服务器的 LOCAL INFILE 请求后会按文件名打开本地文件发送。
+# 这里注册伪文件名到内存字节块迭代器的映射，并替换 PyMySQL 的文件发送逻辑：
+# 命中注册表时直接把内存数据写入 socket，省去临时文件的写盘和回读。
+
+# {伪文件名: 字节块迭代器}
+_infile_streams: Dict[str, Iterable[bytes]] = {}
+
+# 单个数据包大小
+_INFILE_PACKET_SIZE = 64 * 1024
+
+
+def _send_infile_stream(chunks: Iterable[bytes], conn) -> None:
+    """将字节块按数据包大小切分后发送给服务器"""
+    packet_size = min(conn.max_allowed_packet, _INFILE_PACKET_SIZE)
+    for chunk in chunks:
+        view = memoryview(chunk)
+        for i in range(0, len(view), packet_size):
+            conn.write_packet(view[i:i + packet_size])
+
+
+def _lookup_infile_stream(filename: Union[str, bytes]) -> Optional[Iterable[bytes]]:
+    if isinstance(filename, bytes):
+        filename = filename.decode('utf-8', errors='replace')
+    return _infile_streams.get(filename)
+
+
+def _install_infile_stream_hook() -> bool:
+    """安装 PyMySQL 钩子，返回当前 PyMySQL 版本是否支持内存数据流"""
+    connections = pymysql.connections
+    
+    # PyMySQL >= 1.1.1：模块级函数 _send_local_file(filename, conn)
+    original_send = getattr(connections, '_send_local_file', None)
+    if callable(original_send):
+        def _send_local_file(filename, conn):
+            chunks = _lookup_infile_stream(filename)
+            if chunks is None:
+                return original_send(filename, conn)
+            _send_infile_stream(chunks, conn)
+        
+        connections._send_local_file = _send_local_file
+        return True
+    
+    # 早期版本：LoadLocalFile.send_data()，结束包由 send_data 自己发送
+    load_local_file = getattr(connections, 'LoadLocalFile', None)
+    if load_local_file is not None:
+        class _StreamLoadLocalFile(load_local_file):
+            def send_data(self):
+                chunks = _lookup_infile_stream(self.filename)
+                if chunks is None:
+                    return super().send_data()
+                try:
+                    _send_infile_stream(chunks, self.connection)
+                finally:
+                    self.connection.write_packet(b"")
+        
+        connections.LoadLocalFile = _StreamLoadLocalFile
+        return True
+    
+    return False
+
+
+INFILE_STREAM_SUPPORTED = _install_infile_stream_hook()
+
+
 class DatabaseManager:
     """数据库管理器 - 高性能版"""
     
@@ -46,7 +114,7 @@ class DatabaseManager:
         return self._engine
     
     @contextmanager
-    def get_connection(self):
+    def get_connection(self, multi_statements: bool = False):
         """
         获取 PyMySQL 连接（上下文管理器）
         
@@ -56,6 +124,9 @@ class DatabaseManager:
         - 需要事务一致性的长时间操作
         
         如果需要高性能的短连接操作，请使用 engine 属性（连接池）
+        
+        Args:
+            multi_statements: 是否允许一次 execute 发送多条以分号分隔的语句
         """
         mysql = self.config.mysql
         conn = pymysql.connect(
@@ -67,7 +138,8 @@ class DatabaseManager:
             charset='utf8mb4',
             cursorclass=pymysql.cursors.DictCursor,
             local_infile=True,          # 允许 LOAD DATA LOCAL
-            autocommit=False
+            autocommit=False,
+            client_flag=CLIENT.MULTI_STATEMENTS if multi_statements else 0
         )
         try:
             yield conn
@@ -297,10 +369,12 @@ class DatabaseManager:
                     return False, str(e)
     
     def bulk_insert(self, table_name: str, columns: List[str], data: List[Tuple], 
-                    batch_size: int = 5000, conn=None) -> int:
+                    batch_size: int = 20000, conn=None) -> int:
         """
         高性能批量插入
         使用 executemany + 批量提交，比 to_sql 快 5-10 倍
+        PyMySQL 会把 INSERT ... VALUES 的 executemany 改写为多行 VALUES 语句，
+        单条语句的长度上限放宽到服务端 max_allowed_packet，减少网络往返
         
         Args:
             conn: 可选，复用已有连接
@@ -315,12 +389,22 @@ class DatabaseManager:
         
         def do_insert(connection):
             nonlocal total_inserted
-            with connection.cursor() as cursor:
+            # 显式使用普通游标：调用方传入的连接可能是 DictCursor（get_connection），
+            # 下面按下标读取查询结果
+            with connection.cursor(pymysql.cursors.Cursor) as cursor:
                 # 优化插入性能的设置
                 cursor.execute("SET autocommit=0")
                 cursor.execute("SET unique_checks=0")
                 cursor.execute("SET foreign_key_checks=0")
                 
+                # 多行 INSERT 语句按 max_allowed_packet 切分（默认只有 1MB），预留少量余量给协议头
+                cursor.execute("SELECT @@max_allowed_packet")
+                server_packet = cursor.fetchone()[0]
+                cursor.max_stmt_length = max(
+                    min(server_packet, connection.max_allowed_packet) - 1024,
+                    cursor.max_stmt_length
+                )
+                
                 # 分批插入
                 for i in range(0, len(data), batch_size):
                     batch = data[i:i + batch_size]
@@ -342,15 +426,16 @@ class DatabaseManager:
         return total_inserted
     
     def load_data_infile(self, table_name: str, columns: List[str], 
-                         temp_file: str, conn=None) -> int:
+                         source: Union[str, Iterable[bytes]], conn=None) -> int:
         """
-        使用 LOAD DATA LOCAL INFILE 高速导入 CSV 文件
+        使用 LOAD DATA LOCAL INFILE 高速导入 CSV 数据
         比 executemany 快 10-50 倍
         
         Args:
             table_name: 目标表名
             columns: 列名列表
-            temp_file: 临时 CSV 文件路径
+            source: 临时 CSV 文件路径，或 UTF-8 编码的 CSV 字节块迭代器
+                    （内存数据流，需要 INFILE_STREAM_SUPPORTED 为 True）
             conn: 可选，复用已有连接
             
         Returns:
@@ -358,8 +443,13 @@ class DatabaseManager:
         """
         column_names = ', '.join([f'`{col}`' for col in columns])
         
-        # 使用正斜杠路径（MySQL 兼容）
-        file_path = temp_file.replace('\\', '/')
+        if isinstance(source, str):
+            # 使用正斜杠路径（MySQL 兼容）
+            file_path = source.replace('\\', '/')
+        else:
+            # 内存数据流：注册伪文件名，服务器请求该文件时由钩子发送内存数据
+            file_path = f"capacity-stream-{uuid.uuid4().hex}.csv"
+            _infile_streams[file_path] = source
         
         sql = f"""
             LOAD DATA LOCAL INFILE '{file_path}'
@@ -391,11 +481,14 @@ class DatabaseManager:
                 
                 return row_count
         
-        if conn:
-            return do_load(conn)
-        else:
-            with self.get_fast_connection() as connection:
-                return do_load(connection)
+        try:
+            if conn:
+                return do_load(conn)
+            else:
+                with self.get_fast_connection() as connection:
+                    return do_load(connection)
+        finally:
+            _infile_streams.pop(file_path, None)
     
     # 字段类型到 MySQL 类型的映射
     TYPE_MAPPING = {
@@ -420,6 +420,8 @@ async def start_processing(task_id: str = Body(..., embed=True)):
         try:
             processor = DataProcessor(config, work_dir, logger)
             result = processor.process()
+            # 刷新日志文件，后面要从文件读取完整日志
+            logger.close()
             
             # 更新历史记录（日志已写入文件，不需要再保存）
             status = "completed" if result.get("success") else "failed"
@@ -439,6 +441,7 @@ async def start_processing(task_id: str = Body(..., embed=True)):
             global_task_lock["stage"] = None
             global_task_lock["started_at"] = None
         except Exception as e:
+            logger.close()
             history_manager.update(task_id, status="failed", error=str(e))
             # 从文件读取最新日志
             logs_from_file = history_manager.get_logs(task_id)
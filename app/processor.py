@@ -1,54 +1,116 @@
 """
 数据处理核心模块 - 性能优化版
 """
+import atexit
+import codecs
+import csv
 import os
 import re
 import time
 import zipfile
 import multiprocessing
+import posixpath
+import queue
+import threading
+import xml.etree.ElementTree as ET
 import numpy as np
 import pandas as pd
 import sqlparse
+from openpyxl import load_workbook
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, from_excel, from_ISO8601
 from pathlib import Path
-from typing import Any, Callable, Dict, Generator, List, Optional, Tuple
-from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Generator, Iterable, List, Optional, Sequence, Tuple
+from datetime import date, datetime
+from collections import deque
+from functools import lru_cache
+from contextlib import ExitStack
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from io import StringIO
 
 from app.config import AppConfig, SQL_SCRIPT
-from app.database import DatabaseManager
+from app.database import DatabaseManager, INFILE_STREAM_SUPPORTED
+
+
+@lru_cache(maxsize=None)
+def _sql_split_pattern(delimiter: str) -> re.Pattern:
+    """
+    构建按分隔符切分 SQL 语句的正则：每次匹配一条语句，
+    字符串、反引号标识符和注释整体匹配，其中的分隔符不会截断语句
+    """
+    if delimiter == ';':
+        plain = r"[^;'\"`]"
+    else:
+        plain = rf"(?!{re.escape(delimiter)})[^'\"`]"
+    return re.compile(
+        r"((?:'(?:[^'\\]|\\.)*'"            # 单引号字符串
+        r'|"(?:[^"\\]|\\.)*"'               # 双引号字符串
+        r"|`[^`]*`"                         # 反引号标识符
+        r"|--\s[^\n]*|#[^\n]*"              # 单行注释
+        r"|/\*.*?\*/"                       # 块注释
+        rf"|{plain}"                        # 普通字符
+        r"|['\"`])+)"                       # 未闭合的引号按普通字符处理
+        rf"(?:{re.escape(delimiter)})?",    # 语句末尾的分隔符
+        re.DOTALL
+    )
 
 
 class ProcessLogger:
     """处理日志记录器"""
     
+    # 这些级别的日志立即刷新到文件，其余日志先写入缓冲区
+    FLUSH_LEVELS = {"ERROR", "SUCCESS"}
+    
     def __init__(self, log_file: Optional[Path] = None, callback: Optional[Callable[[str], None]] = None):
         self.logs: List[str] = []
         self.log_file = log_file
         self.callback = callback
+        self._fh = None
+        # CSV 导入流水线会从多个线程记录日志
+        self._lock = threading.Lock()
         # 如果指定了日志文件，确保目录存在
         if self.log_file:
             self.log_file.parent.mkdir(parents=True, exist_ok=True)
             # 清空或创建日志文件
             self.log_file.write_text("", encoding='utf-8')
     
+    def _get_handle(self):
+        """获取日志文件句柄（首次写入时打开并保持，避免每条日志都 open/close）"""
+        if self._fh is None:
+            self._fh = self.log_file.open("a", encoding='utf-8', buffering=8192)
+            atexit.register(self.close)
+        return self._fh
+    
     def log(self, message: str, level: str = "INFO"):
         """记录日志"""
         timestamp = datetime.now().strftime("%H:%M:%S")
         entry = f"[{timestamp}] [{level}] {message}"
-        self.logs.append(entry)
-        
-        # 实时写入文件
-        if self.log_file:
+        with self._lock:
+            self.logs.append(entry)
+            
+            # 写入文件（缓冲写入，ERROR/SUCCESS 立即刷新）
+            if self.log_file:
+                try:
+                    fh = self._get_handle()
+                    fh.write(entry + "\n")
+                    if level in self.FLUSH_LEVELS:
+                        fh.flush()
+                except Exception as e:
+                    # 如果写入失败，至少记录到内存
+                    print(f"写入日志文件失败: {e}")
+            
+            if self.callback:
+                self.callback(entry)
+    
+    def close(self):
+        """刷新并关闭日志文件（之后再记录日志会重新打开）"""
+        if self._fh is not None:
             try:
-                with self.log_file.open("a", encoding='utf-8') as f:
-                    f.write(entry + "\n")
-            except Exception as e:
-                # 如果写入失败，至少记录到内存
-                print(f"写入日志文件失败: {e}")
-        
-        if self.callback:
-            self.callback(entry)
+                self._fh.close()
+            except Exception:
+                pass
+            self._fh = None
+            atexit.unregister(self.close)
     
     def info(self, message: str):
         self.log(message, "INFO")
@@ -66,14 +128,451 @@ class ProcessLogger:
         return self.logs.copy()
 
 
+# 单元格类型标记（用于推断列类型，与 pandas 读取 Excel 时的列类型推断一致）
+_CELL_EMPTY = 1
+_CELL_BOOL = 2
+_CELL_NUMBER = 4
+_CELL_NON_INTEGER = 8
+_CELL_OTHER = 16
+
+
+def _classify_excel_cell(value: Any) -> Tuple[str, int]:
+    """
+    将单元格值格式化为文本并返回类型标记
+    数值按单个值格式化（整数值的浮点数还原为整数，与 pandas 一致），
+    所在列最终是否按浮点数输出由 _write_rows_csv 根据整列类型决定
+    """
+    if value is None or value == '':
+        return '', _CELL_EMPTY
+    if isinstance(value, bool):
+        return str(value), _CELL_BOOL
+    if isinstance(value, float):
+        if value != value:  # NaN
+            return '', _CELL_EMPTY
+        if value.is_integer():
+            return str(int(value)), _CELL_NUMBER
+        return repr(value), _CELL_NUMBER | _CELL_NON_INTEGER
+    if isinstance(value, int):
+        return str(value), _CELL_NUMBER
+    if isinstance(value, datetime):
+        return str(value), _CELL_OTHER
+    if isinstance(value, date):
+        return f"{value} 00:00:00", _CELL_OTHER
+    return str(value), _CELL_OTHER
+
+
+def _format_excel_cell(value: Any) -> str:
+    """将单元格值格式化为文本，格式与 pandas 读取 Excel 后 to_csv 的输出保持一致"""
+    return _classify_excel_cell(value)[0]
+
+
+def _numeric_column_fixes(flags: List[int]) -> Dict[int, Callable[[str], str]]:
+    """
+    根据整列的类型标记找出输出格式需要调整的列（与 pandas 的列类型推断一致）：
+    只含数值/布尔值的列，有空值或非整数时为 float64（1 -> 1.0，True -> 1.0），
+    布尔值与整数混合时为 int64（True -> 1）；含其他类型的列为 object，保持单个值的格式
+    """
+    fixes: Dict[int, Callable[[str], str]] = {}
+    for i, flag in enumerate(flags):
+        if flag & _CELL_OTHER or not flag & (_CELL_BOOL | _CELL_NUMBER):
+            continue
+        if flag & (_CELL_EMPTY | _CELL_NON_INTEGER):
+            fixes[i] = _to_float_text
+        elif flag & _CELL_BOOL and flag & _CELL_NUMBER:
+            fixes[i] = _to_int_text
+    return fixes
+
+
+def _to_float_text(text: str) -> str:
+    if text == '':
+        return ''
+    if text == 'True':
+        return '1.0'
+    if text == 'False':
+        return '0.0'
+    return repr(float(text))
+
+
+def _to_int_text(text: str) -> str:
+    if text == 'True':
+        return '1'
+    if text == 'False':
+        return '0'
+    return text
+
+
+def _build_csv_header(row: Sequence[Any]) -> List[str]:
+    """构建表头：空列名命名为 "Unnamed: i"，重复列名追加 ".1"、".2" 后缀（与 pandas 一致）"""
+    header = []
+    counts: Dict[str, int] = {}
+    for i, value in enumerate(row):
+        name = base = _format_excel_cell(value) or f"Unnamed: {i}"
+        while name in counts:
+            counts[base] += 1
+            name = f"{base}.{counts[base]}"
+        counts[name] = 0
+        header.append(name)
+    return header
+
+
+def _write_rows_csv(rows: Iterable[Sequence[Any]], output_file: Path):
+    """
+    将行迭代器流式写出为 CSV，首行作为表头
+    不构建 DataFrame，内存占用只与单行大小相关；末尾的空行与 pandas 一样丢弃
+    写出时记录每列的值类型，整列推断为浮点数等需要调整格式的列，写完后再改写一遍文件
+    """
+    rows = iter(rows)
+    with open(output_file, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        first = next(rows, None)
+        if first is None:
+            return
+        header = _build_csv_header(first)
+        writer.writerow(header)
+        
+        column_count = len(header)
+        flags = [0] * column_count
+        pending_empty = 0
+        for row in rows:
+            cells = []
+            for i, value in enumerate(row):
+                text, flag = _classify_excel_cell(value)
+                cells.append(text)
+                if i < column_count:
+                    flags[i] |= flag
+            if not any(cells):
+                # 暂不写出空行，后面还有数据时再补上
+                pending_empty += 1
+                continue
+            if pending_empty:
+                writer.writerows([[''] * len(cells)] * pending_empty)
+                pending_empty = 0
+                flags = [flag | _CELL_EMPTY for flag in flags]
+            elif len(cells) < column_count:
+                for i in range(len(cells), column_count):
+                    flags[i] |= _CELL_EMPTY
+            writer.writerow(cells)
+    
+    fixes = _numeric_column_fixes(flags)
+    if fixes:
+        _rewrite_csv_columns(output_file, fixes)
+
+
+def _rewrite_csv_columns(output_file: Path, fixes: Dict[int, Callable[[str], str]]):
+    """按列改写已写出的 CSV（写入临时文件后替换）"""
+    temp_file = output_file.with_name(output_file.name + '.tmp')
+    with open(output_file, 'r', encoding='utf-8', newline='') as src, \
+            open(temp_file, 'w', encoding='utf-8', newline='') as dst:
+        reader = csv.reader(src)
+        writer = csv.writer(dst, lineterminator='\n')
+        writer.writerow(next(reader))
+        for row in reader:
+            for i, fix in fixes.items():
+                if i < len(row):
+                    row[i] = fix(row[i])
+            writer.writerow(row)
+    os.replace(temp_file, output_file)
+
+
+def _convert_excel_calamine(excel_file: Path, sheet_filter: set) -> int:
+    """使用 calamine 将 Excel 的每个 sheet 导出为 CSV，返回导出的 sheet 数"""
+    from python_calamine import CalamineWorkbook
+    
+    processed = 0
+    workbook = CalamineWorkbook.from_path(str(excel_file))
+    try:
+        for sheet_name in workbook.sheet_names:
+            if sheet_name not in sheet_filter:
+                output_file = excel_file.parent / f"{excel_file.stem}_{sheet_name}.csv"
+                sheet = workbook.get_sheet_by_name(sheet_name)
+                rows = sheet.iter_rows()
+                # iter_rows 从数据区域的起始列开始，左侧空列需要补齐
+                offset = sheet.start[1] if sheet.start else 0
+                if offset:
+                    rows = ([''] * offset + row for row in rows)
+                _write_rows_csv(rows, output_file)
+                processed += 1
+    finally:
+        workbook.close()
+    return processed
+
+
+# 行数超过该值的 sheet 改用 zipfile + iterparse 直接流式解析，绕开 openpyxl 的逐单元格开销
+XLSX_STREAM_MIN_ROWS = 50000
+
+_XLSX_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_XLSX_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_PKG_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+# 逐单元格/逐元素使用的标签名（预先拼接，避免每次重复格式化字符串）
+_XLSX_V = f'{_XLSX_NS}v'
+_XLSX_IS = f'{_XLSX_NS}is'
+_XLSX_T = f'{_XLSX_NS}t'
+_XLSX_R = f'{_XLSX_NS}r'
+_XLSX_SHEET_DATA = f'{_XLSX_NS}sheetData'
+
+
+def _xlsx_column_index(ref: str) -> int:
+    """将单元格坐标（如 "AB12"）的列字母转换为从 0 开始的列序号"""
+    index = 0
+    for ch in ref:
+        if not ch.isalpha():
+            break
+        index = index * 26 + (ord(ch.upper()) - 64)
+    return index - 1
+
+
+def _xlsx_text(elem) -> str:
+    """提取 <si>/<is> 中的文本（直接的 <t> 和富文本 <r><t>，忽略注音 <rPh>）"""
+    parts = []
+    for child in elem:
+        if child.tag == _XLSX_T:
+            parts.append(child.text or '')
+        elif child.tag == _XLSX_R:
+            parts.append(child.findtext(_XLSX_T) or '')
+    return ''.join(parts)
+
+
+class XlsxStreamReader:
+    """
+    XLSX 流式读取器：整个工作簿只打开一次 zip，sharedStrings 和样式只解析一次，
+    sheet 数据用 iterparse 边解压边解析，内存占用只与单行大小相关
+    单元格取值规则与 openpyxl 的 data_only 模式一致（日期格式的数字转换为 datetime）
+    """
+    
+    def __init__(self, excel_file: Path):
+        self.archive = zipfile.ZipFile(excel_file)
+        self._shared_strings: Optional[List[str]] = None
+        self._date_styles: Optional[set] = None
+        self._timedelta_styles: Optional[set] = None
+        self._sheet_paths: Optional[Dict[str, str]] = None
+        self._epoch = None
+    
+    def close(self):
+        self.archive.close()
+    
+    @property
+    def shared_strings(self) -> List[str]:
+        """共享字符串表（首次使用时解析）"""
+        if self._shared_strings is None:
+            strings = []
+            if 'xl/sharedStrings.xml' in self.archive.namelist():
+                with self.archive.open('xl/sharedStrings.xml') as f:
+                    for _, elem in ET.iterparse(f):
+                        if elem.tag == f'{_XLSX_NS}si':
+                            strings.append(_xlsx_text(elem))
+                            elem.clear()
+            self._shared_strings = strings
+        return self._shared_strings
+    
+    def _load_styles(self):
+        """解析 styles.xml，找出日期/时长格式对应的样式序号"""
+        self._date_styles, self._timedelta_styles = set(), set()
+        if 'xl/styles.xml' not in self.archive.namelist():
+            return
+        root = ET.fromstring(self.archive.read('xl/styles.xml'))
+        custom_formats = {
+            int(fmt.get('numFmtId')): fmt.get('formatCode')
+            for fmt in root.iter(f'{_XLSX_NS}numFmt')
+        }
+        cell_xfs = root.find(f'{_XLSX_NS}cellXfs')
+        if cell_xfs is None:
+            return
+        for style_id, xf in enumerate(cell_xfs.findall(f'{_XLSX_NS}xf')):
+            fmt_id = int(xf.get('numFmtId', 0))
+            code = custom_formats.get(fmt_id) or BUILTIN_FORMATS.get(fmt_id)
+            if code and is_date_format(code):
+                self._date_styles.add(style_id)
+                if is_timedelta_format(code):
+                    self._timedelta_styles.add(style_id)
+    
+    def _load_workbook(self):
+        """解析 workbook.xml 及其关系文件，得到 sheet 名称到 XML 路径的映射和日期纪元"""
+        workbook = ET.fromstring(self.archive.read('xl/workbook.xml'))
+        rels = ET.fromstring(self.archive.read('xl/_rels/workbook.xml.rels'))
+        targets = {rel.get('Id'): rel.get('Target') for rel in rels.iter(f'{_PKG_REL_NS}Relationship')}
+        
+        self._sheet_paths = {}
+        for sheet in workbook.iter(f'{_XLSX_NS}sheet'):
+            target = targets.get(sheet.get(f'{_XLSX_REL_NS}id'))
+            if target:
+                # Target 可能是相对 xl/ 的路径，也可能是以 / 开头的绝对路径
+                path = target.lstrip('/') if target.startswith('/') else posixpath.join('xl', target)
+                self._sheet_paths[sheet.get('name')] = posixpath.normpath(path)
+        
+        props = workbook.find(f'{_XLSX_NS}workbookPr')
+        date1904 = props is not None and props.get('date1904') in ('1', 'true')
+        self._epoch = CALENDAR_MAC_1904 if date1904 else CALENDAR_WINDOWS_1900
+    
+    def _cell_value(self, cell) -> Any:
+        """解析单元格的值"""
+        data_type = cell.get('t', 'n')
+        if data_type == 'inlineStr':
+            inline = cell.find(_XLSX_IS)
+            return _xlsx_text(inline) if inline is not None else None
+        
+        value = cell.findtext(_XLSX_V)
+        if not value:
+            return None
+        if data_type == 'n':
+            number = float(value) if ('.' in value or 'E' in value or 'e' in value) else int(value)
+            style_id = int(cell.get('s', 0))
+            if style_id in self._date_styles:
+                try:
+                    return from_excel(number, self._epoch, timedelta=style_id in self._timedelta_styles)
+                except (OverflowError, ValueError):
+                    return '#VALUE!'
+            return number
+        if data_type == 's':
+            return self.shared_strings[int(value)]
+        if data_type == 'b':
+            return bool(int(value))
+        if data_type == 'd':
+            return from_ISO8601(value)
+        return value
+    
+    def iter_rows(self, sheet_name: str, width: int) -> Generator[List[Any], None, None]:
+        """
+        逐行读取 sheet，从第 1 行第 1 列开始，每行补齐到 width 列
+        中间缺失的行以空行补齐（与 openpyxl 的 iter_rows 一致）
+        """
+        if self._sheet_paths is None:
+            self._load_workbook()
+        if self._date_styles is None:
+            self._load_styles()
+        
+        row_tag, cell_tag = f'{_XLSX_NS}row', f'{_XLSX_NS}c'
+        sheet_data = None
+        expected = 1
+        with self.archive.open(self._sheet_paths[sheet_name]) as f:
+            for event, elem in ET.iterparse(f, events=('start', 'end')):
+                if event == 'start':
+                    if elem.tag == _XLSX_SHEET_DATA:
+                        sheet_data = elem
+                    continue
+                if elem.tag != row_tag:
+                    continue
+                
+                row_index = int(elem.get('r') or expected)
+                while expected < row_index:
+                    yield [None] * width
+                    expected += 1
+                
+                values = [None] * width
+                col = 0
+                for cell in elem.iter(cell_tag):
+                    ref = cell.get('r')
+                    if ref:
+                        col = _xlsx_column_index(ref)
+                    if col < width:
+                        values[col] = self._cell_value(cell)
+                    col += 1
+                yield values
+                expected = row_index + 1
+                
+                # 已处理的行从树中移除，避免整张 sheet 累积在内存中
+                if sheet_data is not None:
+                    sheet_data.clear()
+
+
+def _convert_excel_openpyxl(excel_file: Path, sheet_filter: set) -> int:
+    """
+    使用 openpyxl 将 Excel 的每个 sheet 导出为 CSV，返回导出的 sheet 数
+    使用 read_only + data_only 模式，流式解析 XML 而不构建完整 DOM
+    """
+    processed = 0
+    workbook = load_workbook(excel_file, read_only=True, data_only=True)
+    stream_reader = None
+    try:
+        for sheet in workbook.worksheets:
+            if sheet.title not in sheet_filter:
+                output_file = excel_file.parent / f"{excel_file.stem}_{sheet.title}.csv"
+                try:
+                    sheet.calculate_dimension()
+                except ValueError:
+                    # 部分工具生成的文件不含尺寸信息，需要扫描一遍 sheet 计算
+                    sheet.calculate_dimension(force=True)
+                
+                if (sheet.max_row or 0) > XLSX_STREAM_MIN_ROWS and zipfile.is_zipfile(excel_file):
+                    # 大 sheet 直接流式解析 XML，工作簿内的多个大 sheet 共用一次 sharedStrings 解析
+                    if stream_reader is None:
+                        stream_reader = XlsxStreamReader(excel_file)
+                    rows = stream_reader.iter_rows(sheet.title, sheet.max_column)
+                else:
+                    rows = sheet.iter_rows(min_row=1, min_col=1, values_only=True)
+                _write_rows_csv(rows, output_file)
+                processed += 1
+    finally:
+        workbook.close()
+        if stream_reader is not None:
+            stream_reader.close()
+    return processed
+
+
+def _process_single_excel(excel_file: Path, sheet_filter: set) -> Tuple[int, Optional[str], Optional[str]]:
+    """
+    处理单个 Excel 文件（在子进程中运行，必须是模块级函数才能被 pickle）
+    优先使用 calamine 引擎（Rust 实现，比 openpyxl 快 10 倍以上），失败时回退到 openpyxl
+    
+    子进程无法使用 ProcessLogger，日志信息通过返回值交给主进程记录
+    
+    Returns:
+        (导出的 sheet 数, 警告信息, 错误信息)
+    """
+    warning = None
+    try:
+        return _convert_excel_calamine(excel_file, sheet_filter), None, None
+    except Exception as e:
+        warning = f"calamine 解析失败: {e}，回退到 openpyxl"
+    
+    try:
+        return _convert_excel_openpyxl(excel_file, sheet_filter), warning, None
+    except Exception as e:
+        return 0, warning, str(e)
+
+
+def _read_csv_pyarrow(csv_file: Path, encoding: str, usecols: List[str]) -> pd.DataFrame:
+    """
+    使用 pyarrow 的 CSV 读取器（C++ 多线程解析）读取指定列，所有列都按字符串读取
+    
+    必须在解析时就指定列类型：pd.read_csv(engine='pyarrow', dtype=str) 会先推断出数值类型再转回字符串，
+    "0012"、"1.50"、超长整数等会被改写
+    """
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+    
+    table = pa_csv.read_csv(
+        csv_file,
+        read_options=pa_csv.ReadOptions(encoding=encoding),
+        convert_options=pa_csv.ConvertOptions(
+            column_types={col: pa.string() for col in usecols},
+            include_columns=usecols,
+            null_values=[''],           # 只把空字符串当作 NA
+            strings_can_be_null=True
+        )
+    )
+    return table.to_pandas()
+
+
 class DataProcessor:
     """数据处理器 - 高性能版"""
     
-    # 批量插入大小（根据实际测试，5000 是比较好的平衡点）
-    BATCH_SIZE = 5000
-    # Excel 并行处理的最大线程数（根据 CPU 核心数自动调整）
-    # 使用 CPU 核心数，但至少为 1，最多不超过 8（避免过多线程导致上下文切换开销）
+    # 固定实例属性，去掉 __dict__，热路径上的属性访问更快
+    __slots__ = (
+        'config', 'work_dir', 'logger', 'db', 'results',
+        '_field_map', '_type_map', '_load_data_supported', '_load_data_checked', '_load_data_lock',
+        '_file_cache',
+    )
+    
+    # 批量插入大小（executemany 会按 max_allowed_packet 切分为多行 INSERT，行数批次可以放大）
+    BATCH_SIZE = 20000
+    # LOAD DATA 内存数据流每次序列化的行数
+    INFILE_CHUNK_ROWS = 50000
+    # Excel 并行处理的最大进程数（根据 CPU 核心数自动调整）
+    # 使用 CPU 核心数，但至少为 1，最多不超过 8（避免过多进程导致内存和调度开销）
     MAX_WORKERS = min(max(multiprocessing.cpu_count(), 1), 8)
+    # CSV 导入流水线：解析线程数（pyarrow/C 引擎解析时释放 GIL）和导入线程数（每个线程独占一个数据库连接）
+    CSV_PARSE_WORKERS = min(MAX_WORKERS, 4)
+    CSV_LOAD_WORKERS = min(MAX_WORKERS, 4)
     
     def __init__(self, config: AppConfig, work_dir: Path, logger: ProcessLogger):
         self.config = config
@@ -88,6 +587,11 @@ class DataProcessor:
         # LOAD DATA INFILE 支持状态（在首次使用时检测）
         self._load_data_supported: Optional[bool] = None
         self._load_data_checked = False
+        # 多个导入线程共享检测结果，检测和降级都在锁内进行
+        self._load_data_lock = threading.Lock()
+        
+        # 工作目录文件列表缓存（查找数据目录时遍历一次，之后扫描 CSV 直接复用）
+        self._file_cache: Optional[List[str]] = None
     
     def _build_field_map(self) -> Tuple[Dict[str, str], Dict[str, str]]:
         """
@@ -193,36 +697,36 @@ class DataProcessor:
                     # 所有编码都失败
                     raise Exception(f"无法解压 ZIP 文件，编码检测失败: {e}")
     
+    @staticmethod
+    def _walk(directory: str) -> Generator[os.DirEntry, None, None]:
+        """
+        使用 os.scandir 递归遍历目录，不为每个条目构建 Path 对象
+        先输出本层条目，再依次进入子目录（与 rglob 的顺序一致），不跟随目录软链接
+        """
+        try:
+            with os.scandir(directory) as it:
+                entries = list(it)
+        except OSError:
+            return
+        subdirs = []
+        for entry in entries:
+            yield entry
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+        for subdir in subdirs:
+            yield from DataProcessor._walk(subdir)
+    
     def _scan_files(self, directory: Path, extensions: List[str]) -> Generator[Path, None, None]:
-        """扫描指定扩展名的文件"""
+        """扫描指定扩展名的文件（已缓存工作目录文件列表时直接过滤缓存）"""
+        if self._file_cache is not None:
+            prefix = os.path.join(str(directory), '')
+            files = [path for path in self._file_cache if path.startswith(prefix)]
+        else:
+            files = [entry.path for entry in self._walk(str(directory)) if entry.is_file()]
         for ext in extensions:
-            for file in directory.rglob(f"*{ext}"):
-                yield file
-    
-    def _process_single_excel(self, excel_file: Path, sheet_filter: set) -> int:
-        """处理单个 Excel 文件（用于并行）"""
-        processed = 0
-        try:
-            rel_path = excel_file.relative_to(self.work_dir)
-            
-            # 使用 openpyxl 的 read_only 模式会更快，但这里保持兼容性
-            xl = pd.ExcelFile(excel_file, engine='openpyxl')
-            
-            for sheet_name in xl.sheet_names:
-                if sheet_name not in sheet_filter:
-                    output_file = excel_file.parent / f"{excel_file.stem}_{sheet_name}.csv"
-                    # 直接读取并写入，不做额外处理
-                    df = xl.parse(sheet_name)
-                    df.to_csv(output_file, index=False, encoding='utf-8')
-                    processed += 1
-            
-            xl.close()
-            return processed
-            
-        except Exception as e:
-            rel_path = excel_file.relative_to(self.work_dir)
-            self.logger.error(f"Excel 处理失败 {rel_path}: {e}")
-            return 0
+            for path in files:
+                if path.endswith(ext):
+                    yield Path(path)
     
     def _process_excel_files_parallel(self):
         """并行处理 Excel 文件"""
@@ -236,33 +740,56 @@ class DataProcessor:
         sheet_filter = set(self.config.sheet_filter)
         total_processed = 0
         
-        # 使用线程池并行处理
-        with ThreadPoolExecutor(max_workers=self.MAX_WORKERS) as executor:
+        # 使用进程池并行处理（Excel 解析是 CPU 密集型，线程受 GIL 限制无法真正并行）
+        # 进程池在 Web 服务的工作线程中创建，用 spawn 启动子进程：fork 多线程进程时子进程
+        # 可能继承其他线程持有的锁（logging、数据库驱动等）而死锁
+        max_workers = min(self.MAX_WORKERS, len(excel_files))
+        mp_context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context) as executor:
             futures = {
-                executor.submit(self._process_single_excel, f, sheet_filter): f 
+                executor.submit(_process_single_excel, f, sheet_filter): f 
                 for f in excel_files
             }
             
             for future in as_completed(futures):
                 excel_file = futures[future]
+                rel_path = excel_file.relative_to(self.work_dir)
                 try:
-                    count = future.result()
+                    count, warning, error = future.result()
+                    if warning:
+                        self.logger.warning(f"{rel_path}: {warning}")
+                    if error:
+                        self.logger.error(f"Excel 处理失败 {rel_path}: {error}")
                     total_processed += count
-                    rel_path = excel_file.relative_to(self.work_dir)
                     if count > 0:
                         self.logger.info(f"处理完成: {rel_path} ({count} 个 sheet)")
                 except Exception as e:
-                    rel_path = excel_file.relative_to(self.work_dir)
                     self.logger.error(f"Excel 处理异常 {rel_path}: {e}")
         
         self.logger.info(f"Excel 处理完成，共生成 {total_processed} 个 CSV 文件")
     
     def _detect_encoding(self, file_path: Path) -> str:
-        """快速检测文件编码（只读取前 8KB）"""
-        import chardet
+        """
+        快速检测文件编码（只读取前 8KB）
+        先检查 UTF-8 BOM，再依次尝试按 UTF-8、GBK 解码，都失败时才使用 chardet
+        """
         with open(file_path, 'rb') as f:
             # 只读取前 8KB，足够检测编码，比 64KB 快很多
-            result = chardet.detect(f.read(8192))
+            head = f.read(8192)
+        
+        if head.startswith(codecs.BOM_UTF8):
+            return 'utf-8-sig'
+        
+        # 使用增量解码器（final=False），容忍末尾被截断的多字节字符
+        for encoding in ('utf-8', 'gbk'):
+            try:
+                codecs.getincrementaldecoder(encoding)().decode(head, final=False)
+                return encoding
+            except UnicodeDecodeError:
+                continue
+        
+        import chardet
+        result = chardet.detect(head)
         encoding = result.get('encoding', 'utf-8') or 'utf-8'
         encoding = encoding.lower()
         if 'utf' in encoding:
@@ -271,100 +798,95 @@ class DataProcessor:
             return 'gbk'
         return 'utf-8'
     
-    def _process_csv_file_fast(self, csv_file: Path, table_name: str, 
-                                conn=None, table_created: bool = False) -> Tuple[int, bool]:
+    def _prepare_csv_frame(self, csv_file: Path,
+                           field_map: Optional[Dict[str, str]] = None,
+                           type_map: Optional[Dict[str, str]] = None
+                           ) -> Optional[Tuple[pd.DataFrame, List[str], Dict[str, str]]]:
         """
-        高性能处理单个 CSV 文件
-        使用 LOAD DATA LOCAL INFILE，比 executemany 快 10-50 倍
+        读取单个 CSV 文件并完成字段匹配和类型转换（导入流水线的解析阶段，在线程池中并行执行）
         
         Args:
             csv_file: CSV 文件路径
-            table_name: 目标表名
-            conn: 数据库连接（复用）
-            table_created: 表是否已创建
+            field_map: 字段映射表（由调用方在循环外绑定，默认使用 self._field_map）
+            type_map: 类型映射表（由调用方在循环外绑定，默认使用 self._type_map）
             
         Returns:
-            (导入行数, 表是否已创建)
+            (转换后的 DataFrame, 目标字段列表, 字段类型映射)，跳过的非数据文件返回 None
         """
+        if field_map is None:
+            field_map = self._field_map
+        if type_map is None:
+            type_map = self._type_map
+        
         encoding = self._detect_encoding(csv_file)
         rel_path = csv_file.relative_to(self.work_dir)
         self.logger.info(f"处理 CSV: {rel_path} (编码: {encoding})")
         
-        # 读取 CSV，使用优化参数
-        df = pd.read_csv(
-            csv_file, 
-            encoding=encoding, 
-            thousands=',', 
-            low_memory=True,        # 低内存模式
-            dtype=str,              # 全部作为字符串读取，避免类型推断开销
-            na_values=[''],         # 只把空字符串当作 NA
-            keep_default_na=False   # 不使用默认的 NA 值
-        )
-        
-        # 快速字段匹配（使用预编译的映射表）
-        col_mapping = {}
-        for col in df.columns:
-            if col in self._field_map:
-                col_mapping[col] = self._field_map[col]
+        # 先只读取表头完成字段匹配（使用预编译的映射表），不匹配时无需解析数据
+        header = pd.read_csv(csv_file, nrows=0, encoding=encoding).columns
+        col_mapping = {col: field_map[col] for col in header if col in field_map}
         
         if len(col_mapping) <= 3:
             if 'kpis' in str(csv_file).lower():
                 self.logger.warning(f"跳过非数据文件: {rel_path}")
-                return 0, table_created
+                return None
             raise ValueError(f"字段匹配不足: {rel_path}")
         
-        # 选择需要的列并重命名
-        source_cols = list(col_mapping.keys())
-        target_cols = list(col_mapping.values())
-        
-        # 创建结果 DataFrame，使用目标列名
-        df_result = df[source_cols].copy()
-        df_result.columns = target_cols
+        # 只解析需要的列，未使用的列不解析也不分配内存
+        usecols = list(col_mapping)
         
-        # 替换 NA 为默认值
-        df_result = df_result.fillna('')
-        
-        # 构建目标字段的类型映射
-        column_types = {col: self._type_map.get(col, 'string') for col in target_cols}
+        # 读取 CSV，优先使用 pyarrow 读取器（C++ 多线程解析，比 C 引擎快 5 倍以上）
+        # pyarrow 未安装或解析失败（如跨数据块的引号内换行）时回退到 C 引擎
+        try:
+            df = _read_csv_pyarrow(csv_file, encoding, usecols)
+        except Exception:
+            df = pd.read_csv(
+                csv_file, 
+                encoding=encoding, 
+                usecols=usecols,
+                thousands=',', 
+                low_memory=True,        # 低内存模式
+                dtype=str,
+                na_values=[''],
+                keep_default_na=False
+            )
         
-        # 根据类型处理每列数据
-        for col in target_cols:
-            col_type = column_types.get(col, 'string')
+        # 逐列填充空值、转换类型，收集到字典中最后一次性构建结果 DataFrame
+        # 避免整表 copy + fillna 产生的整表副本，以及逐列回写时的重复分配
+        column_types = {}
+        columns = {}
+        for source_col, col in col_mapping.items():
+            col_type = type_map.get(col, 'string')
+            column_types[col] = col_type
+            series = df[source_col].fillna('')
             
             if col_type == 'datetime':
                 # 日期时间类型处理
-                df_result[col] = self._convert_datetime_column(df_result[col])
+                series = self._convert_datetime_column(series)
             
             elif col_type == 'int':
                 # 整数类型处理
-                df_result[col] = self._convert_int_column(df_result[col])
+                series = self._convert_int_column(series)
             
             elif col_type == 'float':
                 # 浮点数类型处理
-                df_result[col] = self._convert_float_column(df_result[col])
+                series = self._convert_float_column(series)
             
             elif col_type == 'text':
                 # 长文本类型，截断到 65535 字符
-                mask = df_result[col].str.len() > 65535
-                if mask.any():
-                    df_result.loc[mask, col] = df_result.loc[mask, col].str[:65535]
+                series = series.str.slice(0, 65535)
             
             else:  # string 或其他
-                # 字符串类型：去除百分号、截断长度
-                df_result[col] = df_result[col].str.replace('%', '', regex=False)
-                mask = df_result[col].str.len() > 255
-                if mask.any():
-                    df_result.loc[mask, col] = df_result.loc[mask, col].str[:255]
-        
-        # 确保表存在（只在第一次创建）
-        if not table_created:
-            self.db.create_table_from_columns(table_name, target_cols, column_types)
-            table_created = True
+                # 字符串类型：去除百分号、截断长度（translate + slice 两次遍历完成）
+                series = series.str.translate(self._STRIP_PERCENT).str.slice(0, 255)
+            
+            columns[col] = series
         
-        # 使用 LOAD DATA INFILE 导入
-        inserted = self._load_data_infile(df_result, table_name, target_cols, conn)
+        # 创建结果 DataFrame，使用目标列名（各列已是新分配的数据，无需再复制）
+        target_cols = list(columns)
+        df_result = pd.DataFrame(columns, copy=False)
         
-        return inserted, table_created
+        return df_result, target_cols, column_types
     
     def _get_temp_dir(self) -> Path:
         """获取临时目录（使用工作目录下的 .temp 子目录）"""
@@ -387,57 +909,51 @@ class DataProcessor:
         if self._load_data_checked:
             return self._load_data_supported or False
         
-        self._load_data_checked = True
-        supported, message = self.db.check_load_data_support()
-        self._load_data_supported = supported
-        
-        if supported:
-            self.logger.info(f"LOAD DATA INFILE: 已启用 ({message})")
-        else:
-            self.logger.warning(f"LOAD DATA INFILE: 不可用 ({message})，将使用批量插入模式")
+        with self._load_data_lock:
+            # 检测完成后才标记已检测，其他线程在锁上等待结果，不会读到未完成的状态
+            if not self._load_data_checked:
+                supported, message = self.db.check_load_data_support()
+                self._load_data_supported = supported
+                self._load_data_checked = True
+                
+                if supported:
+                    self.logger.info(f"LOAD DATA INFILE: 已启用 ({message})")
+                else:
+                    self.logger.warning(f"LOAD DATA INFILE: 不可用 ({message})，将使用批量插入模式")
         
-        return supported
+        return self._load_data_supported or False
     
     def _load_data_infile(self, df: pd.DataFrame, table_name: str, 
                           columns: List[str], conn=None) -> int:
         """
         使用 LOAD DATA LOCAL INFILE 导入数据
+        CSV 数据分块序列化后直接从内存发送给服务器，不经过临时文件
+        PyMySQL 版本不支持内存数据流时，使用工作目录 .temp 子目录中的临时文件
         如果失败则自动回退到 bulk_insert 方式
-        临时文件放在工作目录的 .temp 子目录中
         """
-        import tempfile
-        
         # 检测是否支持 LOAD DATA INFILE
         if not self._check_load_data_support():
             # 不支持，直接使用 bulk_insert
             return self._bulk_insert_fallback(df, table_name, columns, conn)
         
-        # 获取临时目录
-        temp_dir = self._get_temp_dir()
         temp_file = None
         
         try:
-            # 写入临时 CSV 文件
-            with tempfile.NamedTemporaryFile(
-                mode='w', 
-                suffix='.csv', 
-                delete=False, 
-                encoding='utf-8',
-                newline='',
-                dir=str(temp_dir)  # 使用指定的临时目录
-            ) as f:
-                temp_file = f.name
-                # 写入 CSV（带表头，用于 IGNORE 1 LINES）
-                df.to_csv(f, index=False, header=True, na_rep='\\N')
+            if INFILE_STREAM_SUPPORTED:
+                source = self._iter_csv_chunks(df)
+            else:
+                temp_file = self._write_temp_csv(df)
+                source = temp_file
             
             # 使用 LOAD DATA LOCAL INFILE 导入
-            inserted = self.db.load_data_infile(table_name, columns, temp_file, conn)
+            inserted = self.db.load_data_infile(table_name, columns, source, conn)
             return inserted
             
         except Exception as e:
             # LOAD DATA 失败，标记为不支持并回退
             self.logger.warning(f"LOAD DATA INFILE 执行失败: {e}，回退到批量插入模式")
-            self._load_data_supported = False
+            with self._load_data_lock:
+                self._load_data_supported = False
             return self._bulk_insert_fallback(df, table_name, columns, conn)
             
         finally:
@@ -448,11 +964,36 @@ class DataProcessor:
                 except Exception:
                     pass
     
+    def _iter_csv_chunks(self, df: pd.DataFrame) -> Generator[bytes, None, None]:
+        """分块序列化 CSV（首块带表头，用于 IGNORE 1 LINES），内存占用只与块大小相关"""
+        for start in range(0, len(df), self.INFILE_CHUNK_ROWS):
+            chunk = df.iloc[start:start + self.INFILE_CHUNK_ROWS]
+            yield chunk.to_csv(
+                index=False, header=(start == 0), na_rep='\\N', lineterminator='\n'
+            ).encode('utf-8')
+    
+    def _write_temp_csv(self, df: pd.DataFrame) -> str:
+        """写入临时 CSV 文件（带表头，用于 IGNORE 1 LINES），返回文件路径"""
+        import tempfile
+        
+        with tempfile.NamedTemporaryFile(
+            mode='w', 
+            suffix='.csv', 
+            delete=False, 
+            encoding='utf-8',
+            newline='',
+            dir=str(self._get_temp_dir())  # 使用指定的临时目录
+        ) as f:
+            df.to_csv(f, index=False, header=True, na_rep='\\N', lineterminator='\n')
+            return f.name
+    
     def _bulk_insert_fallback(self, df: pd.DataFrame, table_name: str,
                                columns: List[str], conn=None) -> int:
         """批量插入回退方案"""
-        # 转换为元组列表
-        data_tuples = [tuple(row) for row in df.values]
+        # 转换为元组列表（数值列中的 NaN/NA 需要转为 None 才能作为 NULL 插入）
+        df = df.astype(object).where(df.notna(), None)
+        # itertuples 按列在 C 层生成元组，比逐行遍历 object 数组开销更小
+        data_tuples = list(df.itertuples(index=False, name=None))
         # 使用批量插入
         return self.db.bulk_insert(table_name, columns, data_tuples, self.BATCH_SIZE, conn)
     
@@ -471,39 +1012,63 @@ class DataProcessor:
         '%Y%m%d',                     # 20260106
     ]
     
-    def _detect_datetime_format(self, series: pd.Series, sample_size: int = 100) -> list:
+    # 各时间格式的文本特征（按匹配优先级排列），合并为一个正则，每个样本只需匹配一次
+    # 带 T、时区或小数秒的写法由最后的 ISO8601 分组兜底
+    DATETIME_SIGNATURES = [
+        ('%Y-%m-%d %H:%M:%S', r'\d{4}-\d{1,2}-\d{1,2} \d{1,2}:\d{1,2}:\d{1,2}'),
+        ('%Y-%m-%d %H:%M', r'\d{4}-\d{1,2}-\d{1,2} \d{1,2}:\d{1,2}'),
+        ('%Y/%m/%d %H:%M:%S', r'\d{4}/\d{1,2}/\d{1,2} \d{1,2}:\d{1,2}:\d{1,2}'),
+        ('%Y/%m/%d %H:%M', r'\d{4}/\d{1,2}/\d{1,2} \d{1,2}:\d{1,2}'),
+        ('%Y-%m-%d', r'\d{4}-\d{1,2}-\d{1,2}'),
+        ('%Y/%m/%d', r'\d{4}/\d{1,2}/\d{1,2}'),
+        ('%Y年%m月%d日 %H:%M:%S', r'\d{4}年\d{1,2}月\d{1,2}日 \d{1,2}:\d{1,2}:\d{1,2}'),
+        ('%Y年%m月%d日', r'\d{4}年\d{1,2}月\d{1,2}日'),
+        ('%Y%m%d%H%M%S', r'\d{14}'),
+        ('%Y%m%d', r'\d{8}'),
+        ('ISO8601', r'\d{4}-\d{1,2}-\d{1,2}[T ]\d{1,2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?'),
+    ]
+    DATETIME_PATTERN = re.compile('|'.join(
+        f'(?P<f{i}>{pattern})' for i, (_, pattern) in enumerate(DATETIME_SIGNATURES)
+    ))
+    # 首选格式在样本中的占比达到该值时，直接整列按该格式解析
+    DATETIME_FAST_PATH_RATIO = 0.99
+    
+    def _detect_datetime_format(self, series: pd.Series, sample_size: int = 100,
+                                valid_mask: Optional[pd.Series] = None) -> Tuple[list, float]:
         """
-        采样检测时间格式，返回检测到的格式列表（按匹配数量排序）
+        采样检测时间格式，返回检测到的格式列表（按匹配数量排序）和首选格式在样本中的占比
+        每个样本只做一次正则匹配，而不是对每种格式各解析一遍
+        valid_mask 为调用方已算好的非空掩码，传入时不再重复计算
         """
         # 获取非空样本
-        valid = series[series.notna() & (series != '') & (series.astype(str).str.strip() != '')]
+        if valid_mask is None:
+            series = series.str.strip()
+            valid_mask = series.ne('')
+        valid = series[valid_mask]
         if len(valid) == 0:
-            return self.DATETIME_FORMATS
+            return self.DATETIME_FORMATS, 0.0
         
         # 采样
         sample = valid.head(sample_size) if len(valid) > sample_size else valid
         
-        # 检测每种格式的匹配率
-        format_matches = {}
-        for fmt in self.DATETIME_FORMATS:
-            try:
-                if fmt == 'ISO8601':
-                    parsed = pd.to_datetime(sample, errors='coerce', format='ISO8601')
-                else:
-                    parsed = pd.to_datetime(sample, errors='coerce', format=fmt)
-                match_count = parsed.notna().sum()
-                if match_count > 0:
-                    format_matches[fmt] = match_count
-            except Exception:
-                continue
+        # 统计每种格式的匹配数量
+        counts = [0] * len(self.DATETIME_SIGNATURES)
+        match = self.DATETIME_PATTERN.fullmatch
+        for value in sample:
+            m = match(str(value))
+            if m:
+                counts[int(m.lastgroup[1:])] += 1
         
         # 按匹配数量降序排序，只返回有匹配的格式
+        format_matches = {
+            fmt: count for (fmt, _), count in zip(self.DATETIME_SIGNATURES, counts) if count > 0
+        }
         if format_matches:
             sorted_formats = sorted(format_matches.keys(), key=lambda x: format_matches[x], reverse=True)
-            return sorted_formats
+            return sorted_formats, format_matches[sorted_formats[0]] / len(sample)
         
         # 没有检测到格式，返回默认列表
-        return self.DATETIME_FORMATS
+        return self.DATETIME_FORMATS, 0.0
     
     def _convert_datetime_column(self, series: pd.Series) -> pd.Series:
         """
@@ -511,16 +1076,35 @@ class DataProcessor:
         使用采样检测优化性能：先检测主要格式，再批量处理
         """
         try:
-            valid_mask = series.notna() & (series != '') & (series.astype(str).str.strip() != '')
+            # 上游已 fillna('')，只需 strip 一次即可得到非空掩码，后续复用去空白后的值
+            stripped = series.str.strip()
+            valid_mask = stripped.ne('')
             if not valid_mask.any():
                 return pd.Series([None] * len(series), index=series.index)
             
             # 采样检测格式（只用前 100 条数据检测）
-            detected_formats = self._detect_datetime_format(series, sample_size=100)
+            detected_formats, top_ratio = self._detect_datetime_format(
+                stripped, sample_size=100, valid_mask=valid_mask
+            )
+            
+            # 快速路径：首选格式覆盖绝大部分样本时，直接整列按该格式解析一次
+            # 数据规整时不再需要逐格式筛选剩余行，只有解析失败的少量行才进入后面的多格式处理
+            parsed = None
+            if top_ratio >= self.DATETIME_FAST_PATH_RATIO:
+                try:
+                    parsed = pd.to_datetime(stripped, errors='coerce', format=detected_formats[0])
+                    if parsed.dt.tz is not None:
+                        # 带时区的值与逐格式处理时一致，统一转换为 UTC 时间
+                        parsed = parsed.dt.tz_convert(None)
+                    remaining = valid_mask & parsed.isna()
+                    detected_formats = detected_formats[1:]
+                except Exception:
+                    parsed = None
             
             # 初始化结果
-            parsed = pd.Series([pd.NaT] * len(series), index=series.index)
-            remaining = valid_mask.copy()
+            if parsed is None:
+                parsed = pd.Series([pd.NaT] * len(series), index=series.index)
+                remaining = valid_mask.copy()
             
             # 按检测到的格式顺序处理
             for fmt in detected_formats:
@@ -529,9 +1113,9 @@ class DataProcessor:
                 
                 try:
                     if fmt == 'ISO8601':
-                        temp_parsed = pd.to_datetime(series[remaining], errors='coerce', format='ISO8601')
+                        temp_parsed = pd.to_datetime(stripped[remaining], errors='coerce', format='ISO8601')
                     else:
-                        temp_parsed = pd.to_datetime(series[remaining], errors='coerce', format=fmt)
+                        temp_parsed = pd.to_datetime(stripped[remaining], errors='coerce', format=fmt)
                     
                     success_mask = temp_parsed.notna()
                     if success_mask.any():
@@ -544,7 +1128,7 @@ class DataProcessor:
             # 兜底：用 mixed 模式处理剩余的
             if remaining.any():
                 try:
-                    temp_parsed = pd.to_datetime(series[remaining], errors='coerce', format='mixed', dayfirst=False)
+                    temp_parsed = pd.to_datetime(stripped[remaining], errors='coerce', format='mixed', dayfirst=False)
                     success_mask = temp_parsed.notna()
                     if success_mask.any():
                         success_indices = remaining[remaining].index[success_mask]
@@ -557,41 +1141,33 @@ class DataProcessor:
         except Exception:
             return series
     
+    # 数值清洗时需要去除的字符：百分号和千分位逗号
+    _NUMERIC_STRIP = str.maketrans('', '', '%,')
+    # 字符串列清洗时需要去除的字符：百分号
+    _STRIP_PERCENT = str.maketrans('', '', '%')
+    
+    def _parse_numeric(self, series: pd.Series) -> pd.Series:
+        """
+        解析数值列：一次 translate 同时去除百分号和逗号，再统一转换为数值
+        含百分号的值除以 100 转换为小数（例如：95% → 0.95），无法解析的值为 NaN
+        """
+        has_percent = series.str.contains('%', regex=False, na=False)
+        numeric = pd.to_numeric(series.str.translate(self._NUMERIC_STRIP), errors='coerce')
+        return numeric.where(~has_percent, numeric / 100)
+    
     def _convert_int_column(self, series: pd.Series) -> pd.Series:
-        """转换整数列"""
+        """转换整数列（四舍五入，0 和空值为 NULL）"""
         try:
-            # 检测是否包含百分号
-            has_percent = series.astype(str).str.contains('%', regex=False, na=False)
-            
-            # 去除百分号和逗号
-            cleaned = series.str.replace('%', '', regex=False).str.replace(',', '', regex=False)
-            # 转换为数值
-            numeric = pd.to_numeric(cleaned, errors='coerce')
-            
-            # 如果有百分号，除以100转换为小数
-            numeric[has_percent] = numeric[has_percent] / 100
-            
-            # 四舍五入并转为整数字符串，空值保留为 None
-            return numeric.round().fillna(0).astype(int).astype(str).replace('0', None, regex=False)
+            rounded = self._parse_numeric(series).round()
+            return rounded.where(rounded != 0).astype('Int64')
         except Exception:
             return series
     
     def _convert_float_column(self, series: pd.Series) -> pd.Series:
-        """转换浮点数列"""
+        """转换浮点数列（0 和空值为 NULL）"""
         try:
-            # 检测是否包含百分号
-            has_percent = series.astype(str).str.contains('%', regex=False, na=False)
-            
-            # 去除百分号和逗号
-            cleaned = series.str.replace('%', '', regex=False).str.replace(',', '', regex=False)
-            # 转换为数值
-            numeric = pd.to_numeric(cleaned, errors='coerce')
-            
-            # 如果有百分号，除以100转换为小数（例如：95% → 0.95）
-            numeric[has_percent] = numeric[has_percent] / 100
-            
-            # 保留小数，空值为 None
-            return numeric.fillna(0).astype(str).replace('0.0', None, regex=False).replace('0', None, regex=False)
+            numeric = self._parse_numeric(series)
+            return numeric.where(numeric != 0)
         except Exception:
             return series
     
@@ -604,11 +1180,16 @@ class DataProcessor:
         
         self.logger.info(f"开始查找数据目录，工作目录: {self.work_dir}")
         
-        # 递归查找所有名为 4G 或 5G 的目录
+        # 递归查找所有名为 4G 或 5G 的目录，同时缓存文件列表供后续扫描 CSV 使用
         found_dirs = []
-        for subdir in self.work_dir.rglob('*'):
-            if subdir.is_dir() and subdir.name in target_names:
-                found_dirs.append(subdir)
+        files = []
+        for entry in self._walk(str(self.work_dir)):
+            if entry.is_dir():
+                if entry.name in target_names:
+                    found_dirs.append(Path(entry.path))
+            else:
+                files.append(entry.path)
+        self._file_cache = files
         
         self.logger.info(f"找到 {len(found_dirs)} 个候选目录")
         
@@ -639,50 +1220,148 @@ class DataProcessor:
             self.logger.warning("未找到任何数据目录")
             return
         
-        # 按目录分组处理，使用连接复用
+        # 循环中频繁使用的属性绑定为局部变量，减少属性查找
+        logger = self.logger
+        field_map, type_map = self._field_map, self._type_map
+        
+        # 按目录分组处理，每个目录对应一张表
         for table_name, subdir in data_dirs.items():
-            self.logger.info(f"处理目录: {subdir.relative_to(self.work_dir)} -> 表: {table_name}")
+            logger.info(f"处理目录: {subdir.relative_to(self.work_dir)} -> 表: {table_name}")
             
             # 删除旧表
             self.db.drop_table(table_name)
             
             # 处理该目录下的所有 CSV
             csv_files = list(self._scan_files(subdir, ['.csv']))
-            self.logger.info(f"找到 {len(csv_files)} 个 CSV 文件")
+            logger.info(f"找到 {len(csv_files)} 个 CSV 文件")
             
-            total_rows = 0
             start_time = time.time()
-            table_created = False
+            total_rows = self._import_csv_files(csv_files, table_name, field_map, type_map)
             
-            # 使用连接复用：一个表的所有 CSV 文件共用一个连接
-            with self.db.get_fast_connection() as conn:
-                for i, csv_file in enumerate(csv_files, 1):
+            elapsed = round(time.time() - start_time, 2)
+            speed = round(total_rows / elapsed) if elapsed > 0 else 0
+            logger.success(f"表 {table_name} 导入完成: {total_rows} 行, 耗时 {elapsed}s, 速度 {speed} 行/秒")
+    
+    def _import_csv_files(self, csv_files: List[Path], table_name: str,
+                          field_map: Dict[str, str], type_map: Dict[str, str]) -> int:
+        """
+        将一个目录下的 CSV 文件导入同一张表（解析/导入流水线）
+        解析线程读取并转换 CSV，导入线程各持有一个连接并行 LOAD DATA，
+        两者通过有界队列衔接，CPU 解析和磁盘/网络导入可以同时进行
+        
+        Returns:
+            导入总行数
+        """
+        if not csv_files:
+            return 0
+        
+        logger = self.logger
+        total_files = len(csv_files)
+        start_time = time.time()
+        
+        parse_workers = min(self.CSV_PARSE_WORKERS, total_files)
+        load_workers = min(self.CSV_LOAD_WORKERS, total_files)
+        # 有界队列提供背压：导入跟不上时解析线程会等待，避免转换好的数据堆积在内存中
+        load_queue: queue.Queue = queue.Queue(maxsize=2 * load_workers)
+        stats_lock = threading.Lock()
+        stats = {"files": 0, "rows": 0}
+        
+        def finish_file(rows: int):
+            """记录一个文件处理完成（成功、跳过或失败），每 10 个文件报告一次进度"""
+            with stats_lock:
+                stats["files"] += 1
+                stats["rows"] += rows
+                done, total_rows = stats["files"], stats["rows"]
+            if done % 10 == 0:
+                elapsed = round(time.time() - start_time, 1)
+                logger.info(f"进度: {done}/{total_files} 文件, 已导入 {total_rows} 行, 耗时 {elapsed}s")
+        
+        def load_worker(conn):
+            """导入线程：使用预先打开的独立连接，从队列取出转换好的数据导入，收到 None 时退出"""
+            try:
+                while True:
+                    item = load_queue.get()
+                    if item is None:
+                        return
+                    csv_file, df, columns = item
+                    rows = 0
                     try:
-                        rows, table_created = self._process_csv_file_fast(
-                            csv_file, table_name, conn, table_created
-                        )
-                        total_rows += rows
+                        rows = self._load_data_infile(df, table_name, columns, conn)
+                    except Exception as e:
+                        logger.error(f"CSV 处理失败 {csv_file.relative_to(self.work_dir)}: {e}")
+                    finish_file(rows)
+            except Exception as e:
+                # 导入线程意外退出：继续取走队列中的数据避免解析端阻塞，每个未导入的文件都记录失败
+                while (item := load_queue.get()) is not None:
+                    logger.error(f"CSV 处理失败 {item[0].relative_to(self.work_dir)}: {e}")
+                    finish_file(0)
+                raise
+        
+        # 启动导入线程前在主线程完成 LOAD DATA 支持检测
+        self._check_load_data_support()
+        
+        table_created = False
+        with ExitStack() as conn_stack:
+            # 先打开全部导入连接再开始解析：连接失败时直接中止，不会出现部分文件已导入的情况
+            conns = [conn_stack.enter_context(self.db.get_fast_connection())
+                     for _ in range(load_workers)]
+            with ThreadPoolExecutor(max_workers=load_workers) as load_pool:
+                loaders = [load_pool.submit(load_worker, conn) for conn in conns]
+                try:
+                    with ThreadPoolExecutor(max_workers=parse_workers) as parse_pool:
+                        # 按文件顺序取解析结果，同时最多有 2 倍解析线程数的文件在解析中
+                        files = iter(csv_files)
+                        pending = deque()
+                        for csv_file in files:
+                            pending.append((csv_file, parse_pool.submit(
+                                self._prepare_csv_frame, csv_file, field_map, type_map)))
+                            if len(pending) >= 2 * parse_workers:
+                                break
                         
-                        # 每处理 10 个文件报告一次进度
-                        if i % 10 == 0:
-                            elapsed = round(time.time() - start_time, 1)
-                            self.logger.info(f"进度: {i}/{len(csv_files)} 文件, 已导入 {total_rows} 行, 耗时 {elapsed}s")
+                        while pending:
+                            csv_file, future = pending.popleft()
+                            next_file = next(files, None)
+                            if next_file is not None:
+                                pending.append((next_file, parse_pool.submit(
+                                    self._prepare_csv_frame, next_file, field_map, type_map)))
                             
-                    except Exception as e:
-                        rel_path = csv_file.relative_to(self.work_dir)
-                        self.logger.error(f"CSV 处理失败 {rel_path}: {e}")
-            
-            elapsed = round(time.time() - start_time, 2)
-            speed = round(total_rows / elapsed) if elapsed > 0 else 0
-            self.logger.success(f"表 {table_name} 导入完成: {total_rows} 行, 耗时 {elapsed}s, 速度 {speed} 行/秒")
+                            try:
+                                prepared = future.result()
+                                if prepared is None:
+                                    finish_file(0)
+                                    continue
+                                df, columns, column_types = prepared
+                                
+                                # 确保表存在（按文件顺序，用第一个成功解析的文件建表）
+                                if not table_created:
+                                    self.db.create_table_from_columns(table_name, columns, column_types)
+                                    table_created = True
+                            except Exception as e:
+                                logger.error(f"CSV 处理失败 {csv_file.relative_to(self.work_dir)}: {e}")
+                                finish_file(0)
+                                continue
+                            
+                            load_queue.put((csv_file, df, columns))
+                finally:
+                    for _ in loaders:
+                        load_queue.put(None)
+                
+                # 导入线程的异常在这里抛出
+                for loader in loaders:
+                    loader.result()
+        
+        return stats["rows"]
+    
+    # mysql 客户端的 DELIMITER 指令（独占一行），用于包含分号的存储过程/触发器等语句块
+    SQL_DELIMITER_PATTERN = re.compile(r'^[ \t]*DELIMITER[ \t]+(\S+)[ \t]*$', re.IGNORECASE | re.MULTILINE)
     
     @staticmethod
     def parse_sql_script(sql_text: str) -> List[str]:
         """
         解析 SQL 脚本，提取有效的 SQL 语句
         
-        改进的SQL分割逻辑：直接按分号分割，更可靠
-        这样可以确保所有以分号结尾的语句都被正确识别
+        按分号（或 DELIMITER 指定的分隔符）分割，一次正则扫描完成，
+        字符串、反引号标识符和注释中的分号不会被当作语句结束
         
         Args:
             sql_text: SQL 脚本文本内容
@@ -693,30 +1372,102 @@ class DataProcessor:
         if not sql_text or not sql_text.strip():
             return []
         
-        # 改进的SQL分割逻辑：直接按分号分割，更可靠
-        # 这样可以确保所有以分号结尾的语句都被正确识别
-        parts = sql_text.split(';')
-        valid_sqls = []
+        # 按 DELIMITER 指令切分为若干段，每段使用各自的分隔符
+        segments = []
+        delimiter, pos = ';', 0
+        for m in DataProcessor.SQL_DELIMITER_PATTERN.finditer(sql_text):
+            segments.append((sql_text[pos:m.start()], delimiter))
+            delimiter, pos = m.group(1), m.end()
+        segments.append((sql_text[pos:], delimiter))
         
-        for part in parts:
-            # 处理多行语句：移除以#开头的注释行，但保留SQL语句
-            lines = []
-            for line in part.split('\n'):
-                line = line.strip()
-                # 跳过空行和整行注释
-                if line and not line.startswith('#'):
-                    lines.append(line)
-            
-            if lines:
-                # 合并多行语句，保留换行符（MySQL支持多行SQL）
-                cleaned_sql = '\n'.join(lines)
-                cleaned_sql = cleaned_sql.strip()
+        valid_sqls = []
+        for segment, delimiter in segments:
+            for m in _sql_split_pattern(delimiter).finditer(segment):
+                # 处理多行语句：移除整行注释（# 和 --），保留 SQL 语句的换行
+                lines = []
+                for line in m.group(1).split('\n'):
+                    line = line.strip()
+                    if line and not line.startswith('#') and not line.startswith('-- ') and line != '--':
+                        lines.append(line)
+                
                 # 跳过空语句（可能只剩下注释）
-                if cleaned_sql:
-                    valid_sqls.append(cleaned_sql)
+                if lines:
+                    valid_sqls.append('\n'.join(lines))
         
         return valid_sqls
     
+    # 耗时很短、可以合并发送的语句：DROP/SET/USE/TRUNCATE 以及不含查询的 CREATE
+    LIGHT_SQL_PATTERN = re.compile(
+        r'^(?:DROP|SET|USE|TRUNCATE)\b|^CREATE\b(?!.*\bSELECT\b)', re.IGNORECASE | re.DOTALL
+    )
+    
+    def _group_sql_statements(self, sqls: List[str]) -> List[List[Tuple[int, str]]]:
+        """
+        将 SQL 语句分组：连续的轻量语句合并为一组，其余语句单独成组（便于单独计时）
+        
+        Returns:
+            [[(序号, SQL), ...], ...]，序号从 1 开始
+        """
+        groups: List[List[Tuple[int, str]]] = []
+        light_batch: List[Tuple[int, str]] = []
+        for i, sql in enumerate(sqls, 1):
+            if self.LIGHT_SQL_PATTERN.match(sql):
+                light_batch.append((i, sql))
+                continue
+            if light_batch:
+                groups.append(light_batch)
+                light_batch = []
+            groups.append([(i, sql)])
+        if light_batch:
+            groups.append(light_batch)
+        return groups
+    
+    def _execute_sql_batch(self, cursor, batch: List[Tuple[int, str]], total: int) -> int:
+        """
+        执行一组 SQL 语句，多条语句合并为一次请求发送（连接需开启 MULTI_STATEMENTS）
+        某条语句失败时 MySQL 会跳过同一请求中其后的语句，记录错误后从下一条继续执行
+        
+        Returns:
+            成功执行的语句数
+        """
+        executed = 0
+        while batch:
+            start_time = time.time()
+            preview = batch[0][1][:80].replace('\n', ' ')
+            if len(batch) == 1:
+                self.logger.info(f"执行 SQL ({batch[0][0]}/{total}): {preview}...")
+            else:
+                self.logger.info(
+                    f"批量执行 SQL ({batch[0][0]}-{batch[-1][0]}/{total}，共 {len(batch)} 条): {preview}..."
+                )
+            
+            done = 0
+            affected_rows = 0
+            try:
+                # 语句间用换行隔开分号，避免分号落入行尾的 -- 注释
+                cursor.execute('\n;\n'.join(sql for _, sql in batch))
+                while True:
+                    done += 1
+                    affected_rows += max(cursor.rowcount, 0)
+                    if not cursor.nextset():
+                        break
+            except Exception as e:
+                executed += done
+                self.logger.error(f"SQL 执行失败 ({batch[done][0]}/{total}): {e}")
+                # 继续执行下一条 SQL，不中断
+                batch = batch[done + 1:]
+                continue
+            
+            executed += done
+            elapsed = round(time.time() - start_time, 2)
+            if affected_rows > 0:
+                self.logger.info(f"完成，耗时 {elapsed} 秒，影响 {affected_rows} 行")
+            else:
+                self.logger.info(f"完成，耗时 {elapsed} 秒")
+            break
+        
+        return executed
+    
     def _execute_sql_script(self):
         """
         执行 SQL 脚本
@@ -753,25 +1504,11 @@ class DataProcessor:
         executed_count = 0
         # 使用独立连接（非连接池），确保整个脚本在同一 session 中执行
         # 这对于临时表（TEMPORARY TABLE）至关重要，因为临时表是 session 级别的
-        with self.db.get_connection() as conn:
+        # 开启 MULTI_STATEMENTS，连续的轻量语句合并为一次请求发送，减少网络往返
+        with self.db.get_connection(multi_statements=True) as conn:
             with conn.cursor() as cursor:
-                for i, sql in enumerate(valid_sqls, 1):
-                    start_time = time.time()
-                    preview = sql[:80].replace('\n', ' ')
-                    self.logger.info(f"执行 SQL ({i}/{total}): {preview}...")
-                    
-                    try:
-                        cursor.execute(sql)
-                        executed_count += 1
-                        elapsed = round(time.time() - start_time, 2)
-                        affected_rows = cursor.rowcount if cursor.rowcount >= 0 else 0
-                        if affected_rows > 0:
-                            self.logger.info(f"完成，耗时 {elapsed} 秒，影响 {affected_rows} 行")
-                        else:
-                            self.logger.info(f"完成，耗时 {elapsed} 秒")
-                    except Exception as e:
-                        self.logger.error(f"SQL 执行失败: {e}")
-                        # 继续执行下一条 SQL，不中断
+                for batch in self._group_sql_statements(valid_sqls):
+                    executed_count += self._execute_sql_batch(cursor, batch, total)
                 
                 conn.commit()
         
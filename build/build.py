@@ -8,12 +8,27 @@ CapacityReport 统一构建脚本
 import os
 import sys
 import json
+import hashlib
 import shutil
 import subprocess
 import re
+import string
 import tarfile
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
 
+# orjson 为可选依赖（C 实现，序列化更快），未安装时使用标准库 json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # ============================================================================
 # 配置常量 - 可根据需要修改
 # ============================================================================
@@ -41,6 +56,9 @@ APP_PORT_CONTAINER = 9081
 MYSQL_PORT_HOST = 13306
 MYSQL_PORT_CONTAINER = 3306
 
+# 部署包压缩格式："gzip"（目标机器无需额外工具）或 "zstd"（多线程压缩，目标机器需要安装 zstd）
+PACKAGE_COMPRESSION = "gzip"
+
 # ============================================================================
 # 脚本目录配置
 # ============================================================================
@@ -50,10 +68,23 @@ PROJECT_ROOT = SCRIPT_DIR.parent
 DIST_DIR = PROJECT_ROOT / "dist"
 BUILD_DIR = PROJECT_ROOT / "build"
 TEMP_BUILD_DIR = BUILD_DIR / "temp"
-
-# 颜色输出（Windows 支持）
+# 上次构建应用镜像时的输入哈希（未变化时跳过 docker build，删除该文件可强制重新构建）
+BUILD_HASH_FILE = DIST_DIR / ".last_build_hash"
+# 计算构建输入哈希时跳过的目录（均已被 Dockerfile.dockerignore 排除，不影响镜像内容）
+# .dockerignore 中的目录模式只匹配构建上下文根目录，因此这些目录只在顶层跳过
+HASH_EXCLUDE_TOP_DIRS = frozenset({
+    ".venv", "venv", ".idea", ".vscode",
+    "dist", "build", "cache", "logs", "mysql", "CapacityReportData",
+})
+# 任意层级都跳过的目录（版本库和字节码缓存）
+HASH_EXCLUDE_ANY_DIRS = frozenset({".git", "__pycache__"})
+
+# 运行平台（只检测一次，后续直接使用常量）
 import platform
-if platform.system() == 'Windows':
+IS_WINDOWS = platform.system() == 'Windows'
+
+def enable_windows_ansi():
+    """在 Windows 控制台中启用 ANSI 颜色输出"""
     try:
         import ctypes
         kernel32 = ctypes.windll.kernel32
@@ -61,12 +92,19 @@ if platform.system() == 'Windows':
     except:
         pass
 
+# 输出不是终端（重定向到文件、CI 日志等）时不输出颜色控制符
+USE_COLOR = sys.stdout.isatty()
+
+# 颜色输出（Windows 支持）
+if USE_COLOR and IS_WINDOWS:
+    enable_windows_ansi()
+
 class Colors:
-    GREEN = '\033[92m'
-    YELLOW = '\033[93m'
-    RED = '\033[91m'
-    BLUE = '\033[94m'
-    RESET = '\033[0m'
+    GREEN = '\033[92m' if USE_COLOR else ''
+    YELLOW = '\033[93m' if USE_COLOR else ''
+    RED = '\033[91m' if USE_COLOR else ''
+    BLUE = '\033[94m' if USE_COLOR else ''
+    RESET = '\033[0m' if USE_COLOR else ''
 
 def print_step(msg):
     print(f"\n{Colors.GREEN}{msg}{Colors.RESET}")
@@ -83,16 +121,16 @@ def print_error(msg):
 def print_choice(msg):
     print(f"{Colors.BLUE}{msg}{Colors.RESET}")
 
-def run_cmd(cmd, check=True, capture_output=False):
-    """执行命令"""
-    if isinstance(cmd, str):
-        cmd = cmd.split()
+def run_cmd(cmd, check=True, capture_output=False, env=None, cwd=None):
+    """执行命令（cmd 为参数列表）"""
     try:
         result = subprocess.run(
             cmd,
             check=check,
             capture_output=capture_output,
-            text=True
+            text=True,
+            env=env,
+            cwd=cwd
         )
         return result
     except subprocess.CalledProcessError as e:
@@ -105,16 +143,39 @@ def run_cmd(cmd, check=True, capture_output=False):
         sys.exit(1)
 
 def check_command(cmd):
-    """检查命令是否存在"""
+    """检查命令是否存在（只在 PATH 中查找，不启动进程）"""
+    return shutil.which(cmd) is not None
+
+def _probe(cmd):
+    """执行探测命令，返回是否成功（命令不存在视为失败）"""
     try:
-        if cmd == "docker":
-            subprocess.run([cmd, "--version"], capture_output=True, check=True)
-        elif cmd == "docker-compose":
-            subprocess.run([cmd, "version"], capture_output=True, check=True)
-        return True
-    except (subprocess.CalledProcessError, FileNotFoundError):
+        return subprocess.run(
+            cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False
+        ).returncode == 0
+    except (FileNotFoundError, OSError):
         return False
 
+@dataclass(frozen=True)
+class DockerEnv:
+    """Docker 环境检测结果"""
+    docker: bool                # docker 命令是否可用
+    compose_cmd: str = None     # 可用的 Compose 命令（"docker compose" / "docker-compose"），不可用为 None
+
+@lru_cache(maxsize=1)
+def detect_docker_env():
+    """
+    探测 docker 和 Compose 命令，结果在本次运行中复用
+    命令是否存在通过 PATH 查找判断；找不到 docker-compose 时才实际执行 docker compose 子命令探测
+    """
+    has_docker = check_command("docker")
+    
+    compose_cmd = None
+    if check_command("docker-compose"):
+        compose_cmd = "docker-compose"
+    elif has_docker and _probe(["docker", "compose", "version"]):
+        compose_cmd = "docker compose"
+    return DockerEnv(docker=has_docker, compose_cmd=compose_cmd)
+
 def parse_version(version_str):
     """解析版本字符串为元组，例如 '8.0.44' -> (8, 0, 44)"""
     parts = version_str.split('.')
@@ -136,26 +197,31 @@ def check_version_in_range(version_tuple, min_version, max_version):
         return False
     return min_version <= version_tuple < max_version
 
+# Dockerfile 中 Python 基础镜像的 FROM 行（直接在文件字节上匹配，无需解码）
+FROM_PYTHON_RE = re.compile(rb'^[ \t]*FROM[ \t]+python:(\S+)', re.IGNORECASE | re.MULTILINE)
+
+@lru_cache(maxsize=1)
 def get_python_tag_from_dockerfile():
     """从 Dockerfile 中提取 Python 镜像标签"""
     # 从 build 目录读取 Dockerfile
     dockerfile_path = BUILD_DIR / "Dockerfile"
-    if not dockerfile_path.exists():
+    try:
+        content = dockerfile_path.read_bytes()
+    except FileNotFoundError:
         print_error(f"Dockerfile 不存在: {dockerfile_path}")
         print_error("请确保 build/Dockerfile 文件存在")
         sys.exit(1)
     
-    with open(dockerfile_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            match = re.match(r'^FROM\s+python:(.+?)(?:\s|$)', line, re.IGNORECASE)
-            if match:
-                tag = match.group(1).strip()
-                return tag
+    # 只取第一个匹配的 FROM 行
+    match = FROM_PYTHON_RE.search(content)
+    if match:
+        return match.group(1).decode('ascii')
     
     print_error("无法从 Dockerfile 中找到 Python 镜像标签")
     print_error("请确保 Dockerfile 中包含 'FROM python:xxx' 行")
     sys.exit(1)
 
+@lru_cache(maxsize=1)
 def check_and_get_python_image():
     """检查并获取符合要求的 Python 镜像"""
     dockerfile_tag = get_python_tag_from_dockerfile()
@@ -174,6 +240,7 @@ def check_and_get_python_image():
         print_info(f"如果镜像不存在，将自动拉取: python:{DEFAULT_PYTHON_VERSION}")
         return f"python:{DEFAULT_PYTHON_VERSION}"
 
+@lru_cache(maxsize=1)
 def check_and_get_mysql_image():
     """检查并获取符合要求的 MySQL 镜像"""
     # 检查默认版本是否符合要求
@@ -188,53 +255,339 @@ def check_and_get_mysql_image():
         print_error(f"要求: MySQL >= {'.'.join(map(str, MYSQL_MIN_VERSION))} < {'.'.join(map(str, MYSQL_MAX_VERSION))}")
         sys.exit(1)
 
+# 本地镜像状态缓存：每个镜像名最多查询一次 docker，拉取/构建/标记后直接更新缓存
+_image_cache = set()
+_missing_images = set()
+
+def add_image_to_cache(image_name):
+    """记录新拉取/构建/标记的镜像，避免重新查询 docker"""
+    _image_cache.add(image_name)
+    _missing_images.discard(image_name)
+
 def image_exists(image_name):
-    """检查镜像是否已存在"""
-    try:
-        result = subprocess.run(
-            ["docker", "images", "--format", "{{.Repository}}:{{.Tag}}"],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        return image_name in result.stdout
-    except:
+    """
+    检查镜像是否已存在
+    通过 docker image inspect 直接按名称查询，不需要列出全部镜像，也不会出现前缀误匹配
+    """
+    if image_name in _image_cache:
+        return True
+    if image_name in _missing_images:
         return False
+    if _probe(["docker", "image", "inspect", image_name]):
+        _image_cache.add(image_name)
+        return True
+    _missing_images.add(image_name)
+    return False
+
+def check_images(image_names):
+    """并行查询多个镜像是否存在，结果写入缓存，之后的 image_exists 直接命中"""
+    pending = [name for name in image_names if name not in _image_cache and name not in _missing_images]
+    if len(pending) > 1:
+        with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+            list(executor.map(image_exists, pending))
+    else:
+        for name in pending:
+            image_exists(name)
+
+SIZE_UNITS = ('B', 'KB', 'MB', 'GB', 'TB')
 
 def format_size(size_bytes):
     """格式化文件大小"""
-    for unit in ['B', 'KB', 'MB', 'GB']:
-        if size_bytes < 1024.0:
-            return f"{size_bytes:.1f} {unit}"
-        size_bytes /= 1024.0
-    return f"{size_bytes:.1f} TB"
+    if size_bytes < 1024:
+        return f"{size_bytes:.1f} B"
+    # 二进制位数直接确定单位（每 10 位一级），无需逐级相除
+    index = min((int(size_bytes).bit_length() - 1) // 10, len(SIZE_UNITS) - 1)
+    return f"{size_bytes / (1 << (10 * index)):.1f} {SIZE_UNITS[index]}"
+
+def start_pull(image):
+    """
+    启动后台拉取镜像
+    输出写入临时文件：不会因管道写满而阻塞，也不会与前台输出互相穿插
+    """
+    output = tempfile.TemporaryFile()
+    proc = subprocess.Popen(["docker", "pull", image], stdout=output, stderr=subprocess.STDOUT)
+    return proc, output
+
+def finish_pull(image, pull):
+    """等待后台拉取完成并输出拉取日志，失败时退出"""
+    proc, output = pull
+    returncode = proc.wait()
+    with output:
+        output.seek(0)
+        for line in output.read().decode('utf-8', errors='replace').splitlines():
+            print_info(line)
+    if returncode != 0:
+        print_error(f"命令执行失败: docker pull {image}")
+        sys.exit(1)
+    add_image_to_cache(image)
+
+def pull_image(image):
+    """在前台拉取镜像，保留实时进度输出"""
+    run_cmd(["docker", "pull", image])
+    add_image_to_cache(image)
+
+@lru_cache(maxsize=1)
+def get_package_compressor():
+    """
+    确定部署包的压缩方式
+    镜像 tar 中的层本身压缩率很低，统一使用最快的压缩级别，高压缩级别只会大幅增加耗时
+    
+    Returns:
+        (文件后缀, 外部压缩命令)，外部压缩命令为 None 时使用 tarfile 内置的 gzip
+    """
+    if PACKAGE_COMPRESSION == "zstd":
+        zstd = shutil.which("zstd")
+        if zstd:
+            return ".tar.zst", [zstd, "-T0", "-3", "-q", "-c"]
+        print_warning("未找到 zstd，部署包改用 gzip 压缩")
+    # 优先通过 pigz 多线程压缩
+    pigz = shutil.which("pigz")
+    return ".tar.gz", ([pigz, "-1", "-c"] if pigz else None)
+
+def get_extract_cmd(tar_file):
+    """目标机器上解压部署包的命令"""
+    if tar_file.name.endswith(".tar.zst"):
+        return f"zstd -dc {tar_file.name} | tar -xf -"
+    return f"tar -xzf {tar_file.name}"
+
+@contextmanager
+def open_compressed_tar(file_path):
+    """创建压缩的 tar 包，tar 流直接写入压缩进程，不落地未压缩的中间文件"""
+    compress_cmd = get_package_compressor()[1]
+    if not compress_cmd:
+        with tarfile.open(file_path, 'w:gz', compresslevel=1) as tar:
+            yield tar
+        return
+    
+    with open(file_path, 'wb') as out:
+        proc = subprocess.Popen(compress_cmd, stdin=subprocess.PIPE, stdout=out)
+        try:
+            with tarfile.open(fileobj=proc.stdin, mode='w|') as tar:
+                yield tar
+        finally:
+            proc.stdin.close()
+            returncode = proc.wait()
+    if returncode != 0:
+        raise RuntimeError(f"{Path(compress_cmd[0]).name} 压缩失败，退出码: {returncode}")
+
+@contextmanager
+def open_package_tar(tar_output):
+    """
+    创建输出的部署包
+    先写入 .part 文件，完整写完后再重命名为最终文件名，构建中断时 dist 中不会留下不完整的包
+    """
+    part_file = tar_output.with_name(tar_output.name + ".part")
+    try:
+        with open_compressed_tar(part_file) as tar:
+            yield tar
+    except BaseException:
+        part_file.unlink(missing_ok=True)
+        raise
+    os.replace(part_file, tar_output)
+
+def scan_tree_sorted(root):
+    """
+    使用 os.scandir 递归遍历目录
+    
+    Returns:
+        按相对路径排序的 [(相对路径, 绝对路径)] 列表，目录总排在其内容之前
+    """
+    entries = []
+    stack = [(root, '')]
+    while stack:
+        path, prefix = stack.pop()
+        with os.scandir(path) as it:
+            for entry in it:
+                rel = prefix + entry.name
+                entries.append((rel, entry.path))
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append((entry.path, rel + '/'))
+    entries.sort()
+    return entries
+
+def reproducible_tarinfo(tarinfo):
+    """清除时间戳和属主信息，相同内容的构建产出相同的包"""
+    tarinfo.mtime = 0
+    tarinfo.uid = tarinfo.gid = 0
+    tarinfo.uname = tarinfo.gname = ''
+    return tarinfo
+
+def add_dir_to_tar(tar, root, arcname='.'):
+    """按排序后的固定顺序将目录写入部署包"""
+    tar.addfile(reproducible_tarinfo(tar.gettarinfo(root, arcname)))
+    for rel, path in scan_tree_sorted(root):
+        tarinfo = reproducible_tarinfo(tar.gettarinfo(path, f"{arcname}/{rel}"))
+        if tarinfo.isreg():
+            with open(path, 'rb') as f:
+                tar.addfile(tarinfo, f)
+        else:
+            tar.addfile(tarinfo)
+
+def add_docker_save_to_tar(tar, images, arcname):
+    """
+    将 docker save 的输出直接写入部署包的 arcname 目录，不落地中间的镜像 tar 文件
+    docker save 输出的是 tar 流，每个成员的大小在其头部中已知，可以逐个转写到部署包中；
+    部署时再用 tar 重新打成流交给 docker load
+    
+    Returns:
+        写入的镜像数据字节数
+    """
+    # 镜像目录本身
+    dir_info = tarfile.TarInfo(arcname)
+    dir_info.type = tarfile.DIRTYPE
+    dir_info.mode = 0o755
+    tar.addfile(dir_info)
+    
+    total_size = 0
+    proc = subprocess.Popen(["docker", "save", *images], stdout=subprocess.PIPE)
+    try:
+        with tarfile.open(fileobj=proc.stdout, mode='r|') as source:
+            for member in source:
+                fileobj = source.extractfile(member) if member.isfile() else None
+                member.name = f"{arcname}/{member.name}"
+                if member.islnk():
+                    # 硬链接的目标是包内路径，需要同样加上前缀
+                    member.linkname = f"{arcname}/{member.linkname}"
+                tar.addfile(member, fileobj)
+                if fileobj is not None:
+                    total_size += member.size
+    except tarfile.TarError as e:
+        print_error(f"读取 docker save 输出失败: {e}")
+        sys.exit(1)
+    finally:
+        proc.stdout.close()
+        returncode = proc.wait()
+    
+    if returncode != 0:
+        print_error(f"命令执行失败: docker save {' '.join(images)}")
+        sys.exit(1)
+    return total_size
+
+def read_json(file_path):
+    """读取 JSON 文件（格式错误时抛出 ValueError）"""
+    data = Path(file_path).read_bytes()
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def write_json(file_path, obj):
+    """以 UTF-8、两空格缩进写入 JSON 文件"""
+    if orjson:
+        data = orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    else:
+        data = json.dumps(obj, ensure_ascii=False, indent=2).encode('utf-8')
+    Path(file_path).write_bytes(data)
+
+def fast_copy(src, dst):
+    """
+    复制文件到临时构建目录：优先创建硬链接（只增加 inode 引用，不读写文件内容），
+    跨文件系统或不支持硬链接时回退到 shutil.copy2
+    （shutil.copy2 内部使用 copyfile，已走 sendfile 等平台快速复制路径）
+    注意：硬链接与源文件共享内容，需要修改的目标文件必须先 unlink 再写入；目标目录需已存在
+    """
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+def copy_files(files_to_copy, warn_missing=True):
+    """
+    复制 (源, 目标) 文件列表
+    先按列表顺序检查并提示缺失文件（输出顺序固定），再并行复制；
+    复制回退到 shutil.copy2 时读写期间会释放 GIL，多个文件的 IO 可以重叠
+    """
+    pairs = []
+    for src, dst in files_to_copy:
+        if src.exists():
+            pairs.append((src, dst))
+        elif warn_missing:
+            print_warning(f"{src.name} 不存在: {src}")
+    # 目标目录统一提前创建一次，复制时不再逐个检查
+    for parent in sorted({dst.parent for _, dst in pairs}):
+        parent.mkdir(parents=True, exist_ok=True)
+    if len(pairs) <= 1:
+        for src, dst in pairs:
+            fast_copy(src, dst)
+        return
+    with ThreadPoolExecutor(max_workers=min(4, len(pairs))) as executor:
+        # list() 取出结果，复制失败时在这里抛出异常
+        list(executor.map(lambda pair: fast_copy(*pair), pairs))
+
+def reset_temp_build_dir():
+    """
+    准备空的临时构建目录
+    旧目录先重命名（同一文件系统内为 O(1) 操作），再交给后台线程删除，不阻塞本次构建；
+    上次运行未删完的 temp.stale.* 残留目录一并清理
+    """
+    stale_dirs = list(BUILD_DIR.glob("temp.stale.*"))
+    if TEMP_BUILD_DIR.exists():
+        stale = TEMP_BUILD_DIR.with_name(f"temp.stale.{os.getpid()}.{uuid.uuid4().hex[:8]}")
+        try:
+            os.replace(TEMP_BUILD_DIR, stale)
+            stale_dirs.append(stale)
+        except OSError:
+            # Windows 下目录被占用时无法重命名，退回同步删除
+            shutil.rmtree(TEMP_BUILD_DIR)
+    if stale_dirs:
+        def remove_stale_dirs():
+            for stale_dir in stale_dirs:
+                shutil.rmtree(stale_dir, ignore_errors=True)
+        threading.Thread(target=remove_stale_dirs, daemon=True).start()
+    TEMP_BUILD_DIR.mkdir(parents=True, exist_ok=True)
+
+# CRLF / CR 换行（一次替换统一为 LF）
+CRLF_RE = re.compile(r'\r\n?')
 
 def write_sh_script(file_path, content):
     """写入 shell 脚本，确保使用 LF 换行和 UTF-8 编码"""
-    # 确保内容使用 LF 换行
-    content = content.replace('\r\n', '\n').replace('\r', '\n')
-    # 写入文件（二进制模式确保换行符不被转换）
-    with open(file_path, 'wb') as f:
-        f.write(content.encode('utf-8'))
+    # 二进制写入确保换行符不被转换
+    Path(file_path).write_bytes(CRLF_RE.sub('\n', content).encode('utf-8'))
     # 设置执行权限（在 Linux 上）
-    if platform.system() != 'Windows':
+    if not IS_WINDOWS:
         os.chmod(file_path, 0o755)
 
-def get_deploy_sh():
-    """生成 deploy.sh 脚本内容"""
-    mysql_version = DEFAULT_MYSQL_VERSION
-    return f'''#!/bin/bash
+def get_default_config_json():
+    """生成默认 Configure.json 内容（构建时一次性序列化，直接嵌入脚本）"""
+    return json.dumps({
+        "MySQL_DBInfo": {
+            "host": MYSQL_HOST,
+            "port": MYSQL_PORT,
+            "user": MYSQL_ROOT_USER,
+            "passwd": MYSQL_ROOT_PASSWORD,
+            "dbname": MYSQL_DATABASE
+        },
+        "ExtractField": []
+    }, indent=2, ensure_ascii=False)
+
+class ScriptTemplate(string.Template):
+    """Shell 脚本模板：使用 @{NAME} 占位，bash 的 $ 和 {} 无需转义"""
+    delimiter = '@'
+
+def get_script_vars():
+    """脚本模板公共变量"""
+    return {
+        'APP_PORT_HOST': APP_PORT_HOST,
+        'MYSQL_PORT_HOST': MYSQL_PORT_HOST,
+        'MYSQL_HOST': MYSQL_HOST,
+        'MYSQL_PORT': MYSQL_PORT,
+        'MYSQL_ROOT_USER': MYSQL_ROOT_USER,
+        'MYSQL_ROOT_PASSWORD': MYSQL_ROOT_PASSWORD,
+        'MYSQL_DATABASE': MYSQL_DATABASE,
+        'DEFAULT_CONFIG': get_default_config_json(),
+    }
+
+DEPLOY_SH_TEMPLATE = ScriptTemplate('''#!/bin/bash
 # CapacityReport Deployment Script
 # Run this script on offline machine to import images and start services
 
 set -e
 
-SCRIPT_DIR="$(cd "$(dirname "${{BASH_SOURCE[0]}}")" && pwd)"
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 cd "$SCRIPT_DIR"
 
 # Set permissions automatically
 chmod -R 0777 "$SCRIPT_DIR" 2>/dev/null || true
-find "$SCRIPT_DIR" -type f \\( -name "*.sh" -o -name "*.py" \\) -exec chmod +x {{}} \\; 2>/dev/null || true
+find "$SCRIPT_DIR" -type f \\( -name "*.sh" -o -name "*.py" \\) -exec chmod +x {} \\; 2>/dev/null || true
 
 echo "=========================================="
 echo "CapacityReport Deployment"
@@ -258,16 +611,16 @@ else
     exit 1
 fi
 
-# Check image file
-if [ ! -f "images/capacity-images.tar" ]; then
-    echo "Error: Image file not found: images/capacity-images.tar"
+# Check image files
+if [ ! -f "images/capacity-images/manifest.json" ]; then
+    echo "Error: Image files not found: images/capacity-images"
     exit 1
 fi
 
 echo "Step 1: Checking ports..."
-check_port() {{
-    local port=${{1}}
-    local name=${{2}}
+check_port() {
+    local port=${1}
+    local name=${2}
     local in_use=false
     
     if command -v lsof &> /dev/null; then
@@ -292,14 +645,14 @@ check_port() {{
             exit 1
         fi
     fi
-{{}}
+}
 
-check_port {APP_PORT_HOST} "App"
-check_port {MYSQL_PORT_HOST} "MySQL"
+check_port @{APP_PORT_HOST} "App"
+check_port @{MYSQL_PORT_HOST} "MySQL"
 
 echo ""
 echo "Step 2: Loading images..."
-docker load -i images/capacity-images.tar >/dev/null 2>&1
+tar -cf - -C images/capacity-images . | docker load >/dev/null 2>&1
 
 echo ""
 echo "Step 3: Verifying images..."
@@ -310,7 +663,7 @@ else
     exit 1
 fi
 
-if docker images | grep -q "capacity-mysql.*{mysql_version}"; then
+if docker images | grep -q "capacity-mysql.*@{MYSQL_VERSION}"; then
     echo "  MySQL image: OK"
 else
     echo "  MySQL image: FAILED"
@@ -327,16 +680,7 @@ echo "Step 5: Checking config..."
 if [ ! -f "Configure.json" ]; then
     echo "  Creating default Configure.json..."
     cat > Configure.json << 'EOF'
-{{
-  "MySQL_DBInfo": {{
-    "host": "{MYSQL_HOST}",
-    "port": {MYSQL_PORT},
-    "user": "{MYSQL_ROOT_USER}",
-    "passwd": "{MYSQL_ROOT_PASSWORD}",
-    "dbname": "{MYSQL_DATABASE}"
-  }},
-  "ExtractField": []
-}}
+@{DEFAULT_CONFIG}
 EOF
 else
     if command -v python3 &> /dev/null || command -v python &> /dev/null; then
@@ -348,30 +692,17 @@ try:
     with open('Configure.json', 'r', encoding='utf-8') as f:
         config = json.load(f)
     
-    db_info = config.get('MySQL_DBInfo', {{}})
-    needs_update = False
-    
-    if db_info.get('host') != '{MYSQL_HOST}':
-        db_info['host'] = '{MYSQL_HOST}'
-        needs_update = True
-    
-    if db_info.get('port') != {MYSQL_PORT}:
-        db_info['port'] = {MYSQL_PORT}
-        needs_update = True
-    
-    if db_info.get('user') != '{MYSQL_ROOT_USER}':
-        db_info['user'] = '{MYSQL_ROOT_USER}'
-        needs_update = True
-    
-    if db_info.get('passwd') != '{MYSQL_ROOT_PASSWORD}':
-        db_info['passwd'] = '{MYSQL_ROOT_PASSWORD}'
-        needs_update = True
-    
-    if db_info.get('dbname') != '{MYSQL_DATABASE}':
-        db_info['dbname'] = '{MYSQL_DATABASE}'
-        needs_update = True
+    db_info = config.setdefault('MySQL_DBInfo', {})
+    desired = {
+        'host': '@{MYSQL_HOST}',
+        'port': @{MYSQL_PORT},
+        'user': '@{MYSQL_ROOT_USER}',
+        'passwd': '@{MYSQL_ROOT_PASSWORD}',
+        'dbname': '@{MYSQL_DATABASE}',
+    }
     
-    if needs_update:
+    if db_info != {**db_info, **desired}:
+        db_info.update(desired)
         with open('Configure.json', 'w', encoding='utf-8') as f:
             json.dump(config, f, ensure_ascii=False, indent=2)
         print("  Updated Configure.json")
@@ -392,8 +723,8 @@ $DOCKER_COMPOSE_CMD up -d >/dev/null 2>&1
 
 echo ""
 echo "Step 7: Waiting for services..."
-for i in {{1..30}}; do
-    if docker exec capacity-mysql mysqladmin ping -h localhost -u {MYSQL_ROOT_USER} -p{MYSQL_ROOT_PASSWORD} --silent 2>/dev/null; then
+for i in {1..30}; do
+    if docker exec capacity-mysql mysqladmin ping -h localhost -u @{MYSQL_ROOT_USER} -p@{MYSQL_ROOT_PASSWORD} --silent 2>/dev/null; then
         echo "  MySQL: Ready"
         break
     fi
@@ -405,8 +736,8 @@ for i in {{1..30}}; do
 done
 
 if command -v curl &> /dev/null; then
-    for i in {{1..30}}; do
-        if curl -f http://localhost:{APP_PORT_HOST}/health >/dev/null 2>&1; then
+    for i in {1..30}; do
+        if curl -f http://localhost:@{APP_PORT_HOST}/health >/dev/null 2>&1; then
             echo "  App: Ready"
             break
         fi
@@ -418,7 +749,7 @@ if command -v curl &> /dev/null; then
         sleep 2
     done
 else
-    for i in {{1..30}}; do
+    for i in {1..30}; do
         if docker ps --filter "name=capacity-report-app" --filter "status=running" --format "{{.Names}}" | grep -q "capacity-report-app"; then
             if docker inspect capacity-report-app --format='{{.State.Health.Status}}' 2>/dev/null | grep -q "healthy"; then
                 echo "  App: Ready"
@@ -441,7 +772,7 @@ echo "=========================================="
 echo "Deployment completed!"
 echo "=========================================="
 echo ""
-echo "Access: http://localhost:{APP_PORT_HOST}"
+echo "Access: http://localhost:@{APP_PORT_HOST}"
 echo ""
 echo "Commands:"
 echo "  Logs:    $DOCKER_COMPOSE_CMD logs -f"
@@ -451,28 +782,26 @@ echo "  Status:  $DOCKER_COMPOSE_CMD ps"
 echo ""
 echo "Database:"
 echo "  Host:     localhost"
-echo "  Port:     {MYSQL_PORT_HOST}"
-echo "  User:     {MYSQL_ROOT_USER}"
-echo "  Password: {MYSQL_ROOT_PASSWORD}"
-echo "  Database: {MYSQL_DATABASE}"
+echo "  Port:     @{MYSQL_PORT_HOST}"
+echo "  User:     @{MYSQL_ROOT_USER}"
+echo "  Password: @{MYSQL_ROOT_PASSWORD}"
+echo "  Database: @{MYSQL_DATABASE}"
 echo ""
-'''
+''')
 
-def get_update_sh():
-    """生成 update.sh 脚本内容"""
-    return f'''#!/bin/bash
+UPDATE_SH_TEMPLATE = ScriptTemplate('''#!/bin/bash
 # CapacityReport Update Script
 # Update application container without affecting database
 # Run this script when you need to update the application
 
 set -e
 
-SCRIPT_DIR="$(cd "$(dirname "${{BASH_SOURCE[0]}}")" && pwd)"
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 cd "$SCRIPT_DIR"
 
 # Set permissions automatically
 chmod -R 0777 "$SCRIPT_DIR" 2>/dev/null || true
-find "$SCRIPT_DIR" -type f \\( -name "*.sh" -o -name "*.py" \\) -exec chmod +x {{}} \\; 2>/dev/null || true
+find "$SCRIPT_DIR" -type f \\( -name "*.sh" -o -name "*.py" \\) -exec chmod +x {} \\; 2>/dev/null || true
 
 echo "=========================================="
 echo "CapacityReport Application Update"
@@ -517,9 +846,9 @@ fi
 
 echo ""
 echo "Step 2: Loading new application image..."
-if [ -f "images/capacity-app-update.tar" ]; then
-    echo "  Loading images from capacity-app-update.tar..."
-    docker load -i images/capacity-app-update.tar >/dev/null 2>&1
+if [ -f "images/capacity-app-update/manifest.json" ]; then
+    echo "  Loading images from capacity-app-update..."
+    tar -cf - -C images/capacity-app-update . | docker load >/dev/null 2>&1
     
     if docker images | grep -q "capacity-report-app.*latest"; then
         echo "  App image: Loaded"
@@ -528,7 +857,7 @@ if [ -f "images/capacity-app-update.tar" ]; then
         exit 1
     fi
 else
-    echo "  Error: Image file not found: images/capacity-app-update.tar"
+    echo "  Error: Image files not found: images/capacity-app-update"
     exit 1
 fi
 
@@ -550,18 +879,11 @@ try:
     with open('Configure.json', 'r', encoding='utf-8') as f:
         config = json.load(f)
     
-    db_info = config.get('MySQL_DBInfo', {{}})
-    needs_update = False
-    
-    if db_info.get('host') != '{MYSQL_HOST}':
-        db_info['host'] = '{MYSQL_HOST}'
-        needs_update = True
+    db_info = config.setdefault('MySQL_DBInfo', {})
+    desired = {'host': '@{MYSQL_HOST}', 'port': @{MYSQL_PORT}}
     
-    if db_info.get('port') != {MYSQL_PORT}:
-        db_info['port'] = {MYSQL_PORT}
-        needs_update = True
-    
-    if needs_update:
+    if db_info != {**db_info, **desired}:
+        db_info.update(desired)
         with open('Configure.json', 'w', encoding='utf-8') as f:
             json.dump(config, f, ensure_ascii=False, indent=2)
         print("  Updated Configure.json")
@@ -572,16 +894,7 @@ PYEOF
 else
     echo "  Warning: Configure.json not found, creating default..."
     cat > Configure.json << 'EOF'
-{{
-  "MySQL_DBInfo": {{
-    "host": "{MYSQL_HOST}",
-    "port": {MYSQL_PORT},
-    "user": "{MYSQL_ROOT_USER}",
-    "passwd": "{MYSQL_ROOT_PASSWORD}",
-    "dbname": "{MYSQL_DATABASE}"
-  }},
-  "ExtractField": []
-}}
+@{DEFAULT_CONFIG}
 EOF
 fi
 
@@ -600,8 +913,8 @@ echo "  Application started"
 echo ""
 echo "Step 6: Waiting for application to be ready..."
 if command -v curl &> /dev/null; then
-    for i in {{1..30}}; do
-        if curl -f http://localhost:{APP_PORT_HOST}/health >/dev/null 2>&1; then
+    for i in {1..30}; do
+        if curl -f http://localhost:@{APP_PORT_HOST}/health >/dev/null 2>&1; then
             echo "  App: Ready"
             break
         fi
@@ -613,7 +926,7 @@ if command -v curl &> /dev/null; then
         sleep 2
     done
 else
-    for i in {{1..30}}; do
+    for i in {1..30}; do
         if docker ps --filter "name=capacity-report-app" --filter "status=running" --format "{{.Names}}" | grep -q "capacity-report-app"; then
             if docker inspect capacity-report-app --format='{{.State.Health.Status}}' 2>/dev/null | grep -q "healthy"; then
                 echo "  App: Ready"
@@ -637,7 +950,7 @@ echo "=========================================="
 echo "Update completed!"
 echo "=========================================="
 echo ""
-echo "Application: http://localhost:{APP_PORT_HOST}"
+echo "Application: http://localhost:@{APP_PORT_HOST}"
 echo ""
 echo "Database status:"
 if docker ps --format "{{.Names}}" | grep -q "capacity-mysql"; then
@@ -651,108 +964,151 @@ echo "  View logs:    $DOCKER_COMPOSE_CMD logs -f capacity-app"
 echo "  Restart app:  $DOCKER_COMPOSE_CMD restart capacity-app"
 echo "  Status:       $DOCKER_COMPOSE_CMD ps"
 echo ""
-'''
+''')
+
+def get_deploy_sh():
+    """生成 deploy.sh 脚本内容"""
+    return DEPLOY_SH_TEMPLATE.substitute(get_script_vars(), MYSQL_VERSION=DEFAULT_MYSQL_VERSION)
+
+def get_update_sh():
+    """生成 update.sh 脚本内容"""
+    return UPDATE_SH_TEMPLATE.substitute(get_script_vars())
+
+def compute_source_hash():
+    """
+    计算应用镜像构建输入的 SHA-256（Dockerfile、Dockerfile.dockerignore 和构建上下文中的文件）
+    只跳过确定被 .dockerignore 排除的目录：多计入文件最多导致多构建一次，不会误跳过构建
+    """
+    paths = [
+        str(path) for path in (BUILD_DIR / "Dockerfile", BUILD_DIR / "Dockerfile.dockerignore")
+        if path.exists()
+    ]
+    context_paths = []
+    root = str(PROJECT_ROOT)
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        excluded = HASH_EXCLUDE_TOP_DIRS | HASH_EXCLUDE_ANY_DIRS if current == root else HASH_EXCLUDE_ANY_DIRS
+        with os.scandir(current) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in excluded:
+                        stack.append(entry.path)
+                else:
+                    context_paths.append(entry.path)
+    paths += sorted(context_paths)
+    
+    digest = hashlib.sha256()
+    for path in paths:
+        rel = os.path.relpath(path, PROJECT_ROOT)
+        if os.path.islink(path):
+            digest.update(f"L\0{rel}\0{os.readlink(path)}\0".encode('utf-8'))
+            continue
+        with open(path, 'rb') as f:
+            digest.update(f"F\0{rel}\0{os.fstat(f.fileno()).st_size}\0".encode('utf-8'))
+            while chunk := f.read(1024 * 1024):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+def build_app_image():
+    """使用 build 目录的 Dockerfile 构建应用镜像（完整包和更新包共用）"""
+    print_step("构建应用镜像...")
+    # 使用 build 目录的 Dockerfile
+    dockerfile_path = BUILD_DIR / "Dockerfile"
+    if not dockerfile_path.exists():
+        print_error(f"Dockerfile 不存在: {dockerfile_path}")
+        sys.exit(1)
+    print_info(f"使用 build 目录的 Dockerfile: {dockerfile_path}")
+    
+    # 代码和 Dockerfile 与上次构建相同且镜像仍在时，跳过 docker build
+    source_hash = compute_source_hash()
+    try:
+        last_hash = BUILD_HASH_FILE.read_text(encoding='utf-8').strip()
+    except OSError:
+        last_hash = None
+    if source_hash == last_hash and image_exists("capacity-report-app:latest"):
+        print_info("应用代码和 Dockerfile 未变化，跳过镜像构建")
+        return
+    
+    # 构建时使用项目根目录作为上下文（因为需要复制应用代码），直接传绝对路径，不依赖当前工作目录
+    # 但使用 build 目录的 Dockerfile
+    dockerfile_arg = str(dockerfile_path)
+    # 启用 BuildKit：自动使用与 Dockerfile 同目录的 Dockerfile.dockerignore，
+    # 不再需要把 .dockerignore 临时复制到项目根目录
+    build_env = {**os.environ, "DOCKER_BUILDKIT": "1"}
+    # 镜像内写入 inline cache 元数据，下次构建以上次的镜像作为缓存来源，
+    # 依赖未变化时直接复用 pip install 层（镜像只在本地，不从仓库拉取）
+    build_cmd = ["docker", "build", "--build-arg", "BUILDKIT_INLINE_CACHE=1"]
+    if image_exists("capacity-report-app:latest"):
+        build_cmd += ["--cache-from", "capacity-report-app:latest"]
+    build_cmd += ["-t", "capacity-report-app:latest", "-f", dockerfile_arg, str(PROJECT_ROOT)]
+    run_cmd(build_cmd, env=build_env)
+    add_image_to_cache("capacity-report-app:latest")
+    DIST_DIR.mkdir(exist_ok=True)
+    BUILD_HASH_FILE.write_text(source_hash, encoding='utf-8')
+
+def cleanup_temp_build_dir():
+    """构建完成后清理临时构建目录"""
+    print_step("清理临时文件...")
+    if TEMP_BUILD_DIR.exists():
+        shutil.rmtree(TEMP_BUILD_DIR, ignore_errors=True)
+        print_info("已清理临时构建目录")
 
 def build_full_package():
     """构建完整部署包"""
     print_step("构建完整部署包...")
     
     # 清理临时目录
-    if TEMP_BUILD_DIR.exists():
-        shutil.rmtree(TEMP_BUILD_DIR)
-    TEMP_BUILD_DIR.mkdir(parents=True, exist_ok=True)
+    reset_temp_build_dir()
     
-    # 检查 Docker
-    if not check_command("docker"):
+    # 检查 Docker 和 Docker Compose
+    env = detect_docker_env()
+    if not env.docker:
         print_error("未检测到 Docker，请先安装 Docker Desktop")
         sys.exit(1)
-    
-    # 检查 Docker Compose
-    docker_compose_cmd = None
-    try:
-        subprocess.run(["docker", "compose", "version"], capture_output=True, check=True)
-        docker_compose_cmd = "docker compose"
-    except:
-        if check_command("docker-compose"):
-            docker_compose_cmd = "docker-compose"
-        else:
-            print_error("未检测到 Docker Compose")
-            sys.exit(1)
+    if not env.compose_cmd:
+        print_error("未检测到 Docker Compose")
+        sys.exit(1)
     
     # 检查并获取符合要求的镜像
     print_step("检查镜像版本...")
     python_image = check_and_get_python_image()
     mysql_image = check_and_get_mysql_image()
+    # 部署包中的 MySQL 镜像名（沿用原镜像的版本标签）
+    mysql_tag = mysql_image.split(':', 1)[1]
+    mysql_tagged = f"capacity-mysql:{mysql_tag}"
     
     # 拉取基础镜像（如果不存在则自动拉取）
     print_step("拉取基础镜像...")
-    if not image_exists(python_image):
-        print_info(f"Python 镜像不存在，正在拉取: {python_image}")
-        run_cmd(["docker", "pull", python_image])
-        print_info(f"Python 镜像拉取完成")
+    # 一次并行查询本次构建用到的所有镜像
+    check_images([python_image, mysql_image, "capacity-report-app:latest"])
+    # MySQL 镜像与应用镜像构建没有依赖关系，在后台拉取，与构建同时进行
+    mysql_pull = None
+    if image_exists(mysql_image):
+        print_info(f"MySQL 镜像已存在: {mysql_image}")
     else:
+        print_info(f"MySQL 镜像不存在，后台拉取: {mysql_image}")
+        mysql_pull = start_pull(mysql_image)
+    # 构建应用镜像依赖 Python 镜像，需要先拉取完成
+    if image_exists(python_image):
         print_info(f"Python 镜像已存在: {python_image}")
-    
-    if not image_exists(mysql_image):
-        print_info(f"MySQL 镜像不存在，正在拉取: {mysql_image}")
-        run_cmd(["docker", "pull", mysql_image])
-        print_info(f"MySQL 镜像拉取完成")
     else:
-        print_info(f"MySQL 镜像已存在: {mysql_image}")
+        print_info(f"Python 镜像不存在，正在拉取: {python_image}")
+        pull_image(python_image)
+        print_info(f"Python 镜像拉取完成")
     
     # 构建应用镜像
-    print_step("构建应用镜像...")
-    # 使用 build 目录的 Dockerfile
-    dockerfile_path = BUILD_DIR / "Dockerfile"
-    if not dockerfile_path.exists():
-        print_error(f"Dockerfile 不存在: {dockerfile_path}")
-        sys.exit(1)
-    print_info(f"使用 build 目录的 Dockerfile: {dockerfile_path}")
-    
-    # 构建时使用项目根目录作为上下文（因为需要复制应用代码）
-    os.chdir(PROJECT_ROOT)
-    # 但使用 build 目录的 Dockerfile
-    dockerfile_arg = str(dockerfile_path)
-    # .dockerignore 会自动使用构建上下文根目录的（即 PROJECT_ROOT/.dockerignore）
-    # 从 build 目录复制 .dockerignore 到根目录（临时，构建时使用）
-    dockerignore_build = BUILD_DIR / ".dockerignore"
-    dockerignore_root = PROJECT_ROOT / ".dockerignore"
-    if dockerignore_build.exists():
-        shutil.copy2(dockerignore_build, dockerignore_root)
-        print_info("已使用 build 目录的 .dockerignore")
-    run_cmd(["docker", "build", "-t", "capacity-report-app:latest", "-f", dockerfile_arg, "."])
-    # 清理临时复制的 .dockerignore（如果根目录原本没有）
-    if dockerignore_build.exists() and dockerignore_root.exists():
-        try:
-            # 如果内容相同，说明是从 build 目录复制的，可以删除
-            if dockerignore_build.read_text() == dockerignore_root.read_text():
-                dockerignore_root.unlink()
-                print_info("已清理临时 .dockerignore")
-        except:
-            pass
-    
-    # 标记 MySQL 镜像（提取版本号）
-    mysql_tag = mysql_image.split(':')[1]
-    mysql_tagged = f"capacity-mysql:{mysql_tag}"
-    run_cmd(["docker", "tag", mysql_image, mysql_tagged])
-    
-    # 导出镜像
-    print_step("导出镜像...")
-    images_dir = TEMP_BUILD_DIR / "images"
-    images_dir.mkdir(parents=True, exist_ok=True)
+    build_app_image()
     
-    tar_file = images_dir / "capacity-images.tar"
-    # 提取 MySQL 标签
-    mysql_tag = mysql_image.split(':')[1]
-    mysql_tagged = f"capacity-mysql:{mysql_tag}"
+    # 等待后台的 MySQL 镜像拉取完成
+    if mysql_pull:
+        print_step("等待 MySQL 镜像拉取完成...")
+        finish_pull(mysql_image, mysql_pull)
+        print_info(f"MySQL 镜像拉取完成")
     
-    run_cmd([
-        "docker", "save",
-        "capacity-report-app:latest",
-        mysql_tagged,
-        "-o", str(tar_file)
-    ])
-    print_info(f"镜像导出完成: {format_size(tar_file.stat().st_size)}")
+    # 标记 MySQL 镜像
+    run_cmd(["docker", "tag", mysql_image, mysql_tagged])
+    add_image_to_cache(mysql_tagged)
     
     # 复制配置文件
     print_step("复制配置文件...")
@@ -776,48 +1132,51 @@ def build_full_package():
         (get_source_path("01-init-db.sql", "mysql/init"), TEMP_BUILD_DIR / "mysql" / "init" / "01-init-db.sql"),
     ]
     
-    for src, dst in files_to_copy:
-        if src.exists():
-            dst.parent.mkdir(parents=True, exist_ok=True)
-            shutil.copy2(src, dst)
-        else:
-            print_warning(f"{src.name} 不存在: {src}")
+    copy_files(files_to_copy)
     
     # 更新 Configure.json
     config_file = TEMP_BUILD_DIR / "Configure.json"
-    if config_file.exists():
-        with open(config_file, 'r', encoding='utf-8') as f:
-            config = json.load(f)
-        config['MySQL_DBInfo'] = {
+    try:
+        config = read_json(config_file) if config_file.exists() else None
+    except ValueError as e:
+        print_warning(f"Configure.json 格式错误，保持原文件: {e}")
+        config = None
+    if config is not None:
+        desired = {
             'host': MYSQL_HOST,
             'port': MYSQL_PORT,
             'user': MYSQL_ROOT_USER,
             'passwd': MYSQL_ROOT_PASSWORD,
             'dbname': MYSQL_DATABASE
         }
-        with open(config_file, 'w', encoding='utf-8') as f:
-            json.dump(config, f, ensure_ascii=False, indent=2)
+        # 配置已一致时不重写，保持硬链接即可
+        if config.get('MySQL_DBInfo') != desired:
+            config['MySQL_DBInfo'] = desired
+            # 可能是指向项目根目录 Configure.json 的硬链接，先断开再写入，避免改动源文件
+            config_file.unlink()
+            write_json(config_file, config)
     
     # 生成 deploy.sh
     print_step("生成部署脚本...")
     write_sh_script(TEMP_BUILD_DIR / "deploy.sh", get_deploy_sh())
     
-    # 打包
-    print_step("打包部署包...")
-    tar_output = DIST_DIR / "capacity-report-full.tar.gz"
+    # 导出镜像并打包（镜像直接从 docker save 流式写入部署包）
+    print_step("导出镜像并打包部署包...")
+    tar_output = DIST_DIR / f"capacity-report-full{get_package_compressor()[0]}"
     DIST_DIR.mkdir(exist_ok=True)
     
-    with tarfile.open(tar_output, 'w:gz') as tar:
-        tar.add(TEMP_BUILD_DIR, arcname='.')
+    with open_package_tar(tar_output) as tar:
+        add_dir_to_tar(tar, TEMP_BUILD_DIR)
+        image_size = add_docker_save_to_tar(
+            tar, ["capacity-report-app:latest", mysql_tagged], "./images/capacity-images"
+        )
+    print_info(f"镜像导出完成: {format_size(image_size)}")
     
     print_info(f"部署包已生成: {tar_output}")
     print_info(f"文件大小: {format_size(tar_output.stat().st_size)}")
     
     # 清理临时文件和缓存
-    print_step("清理临时文件...")
-    if TEMP_BUILD_DIR.exists():
-        shutil.rmtree(TEMP_BUILD_DIR, ignore_errors=True)
-        print_info("已清理临时构建目录")
+    cleanup_temp_build_dir()
     
     return tar_output
 
@@ -826,11 +1185,9 @@ def build_update_package():
     print_step("构建更新包...")
     
     # 清理临时目录
-    if TEMP_BUILD_DIR.exists():
-        shutil.rmtree(TEMP_BUILD_DIR)
-    TEMP_BUILD_DIR.mkdir(parents=True, exist_ok=True)
+    reset_temp_build_dir()
     
-    # 检查 Docker
+    # 检查 Docker（更新包不需要 Compose，不做 Compose 探测）
     if not check_command("docker"):
         print_error("未检测到 Docker")
         sys.exit(1)
@@ -841,56 +1198,16 @@ def build_update_package():
     
     # 拉取基础镜像（如果不存在则自动拉取）
     print_step("拉取基础镜像...")
+    check_images([python_image, "capacity-report-app:latest"])
     if not image_exists(python_image):
         print_info(f"Python 镜像不存在，正在拉取: {python_image}")
-        run_cmd(["docker", "pull", python_image])
+        pull_image(python_image)
         print_info(f"Python 镜像拉取完成")
     else:
         print_info(f"Python 镜像已存在: {python_image}")
     
     # 构建应用镜像
-    print_step("构建应用镜像...")
-    # 使用 build 目录的 Dockerfile
-    dockerfile_path = BUILD_DIR / "Dockerfile"
-    if not dockerfile_path.exists():
-        print_error(f"Dockerfile 不存在: {dockerfile_path}")
-        sys.exit(1)
-    print_info(f"使用 build 目录的 Dockerfile: {dockerfile_path}")
-    
-    # 构建时使用项目根目录作为上下文（因为需要复制应用代码）
-    os.chdir(PROJECT_ROOT)
-    # 但使用 build 目录的 Dockerfile
-    dockerfile_arg = str(dockerfile_path)
-    # .dockerignore 会自动使用构建上下文根目录的（即 PROJECT_ROOT/.dockerignore）
-    # 从 build 目录复制 .dockerignore 到根目录（临时，构建时使用）
-    dockerignore_build = BUILD_DIR / ".dockerignore"
-    dockerignore_root = PROJECT_ROOT / ".dockerignore"
-    if dockerignore_build.exists():
-        shutil.copy2(dockerignore_build, dockerignore_root)
-        print_info("已使用 build 目录的 .dockerignore")
-    run_cmd(["docker", "build", "-t", "capacity-report-app:latest", "-f", dockerfile_arg, "."])
-    # 清理临时复制的 .dockerignore（如果根目录原本没有）
-    if dockerignore_build.exists() and dockerignore_root.exists():
-        try:
-            # 如果内容相同，说明是从 build 目录复制的，可以删除
-            if dockerignore_build.read_text() == dockerignore_root.read_text():
-                dockerignore_root.unlink()
-                print_info("已清理临时 .dockerignore")
-        except:
-            pass
-    
-    # 导出镜像
-    print_step("导出镜像...")
-    images_dir = TEMP_BUILD_DIR / "images"
-    images_dir.mkdir(parents=True, exist_ok=True)
-    
-    tar_file = images_dir / "capacity-app-update.tar"
-    run_cmd([
-        "docker", "save",
-        "capacity-report-app:latest",
-        "-o", str(tar_file)
-    ])
-    print_info(f"镜像导出完成: {format_size(tar_file.stat().st_size)}")
+    build_app_image()
     
     # 复制配置文件
     print_step("复制配置文件...")
@@ -906,31 +1223,29 @@ def build_update_package():
         (get_source_path("docker-compose.yml"), TEMP_BUILD_DIR / "docker-compose.yml"),
     ]
     
-    for src, dst in files_to_copy:
-        if src.exists():
-            dst.parent.mkdir(parents=True, exist_ok=True)
-            shutil.copy2(src, dst)
+    copy_files(files_to_copy, warn_missing=False)
     
     # 生成 update.sh
     print_step("生成更新脚本...")
     write_sh_script(TEMP_BUILD_DIR / "update.sh", get_update_sh())
     
-    # 打包
-    print_step("打包更新包...")
-    tar_output = DIST_DIR / "capacity-report-update.tar.gz"
+    # 导出镜像并打包（镜像直接从 docker save 流式写入更新包）
+    print_step("导出镜像并打包更新包...")
+    tar_output = DIST_DIR / f"capacity-report-update{get_package_compressor()[0]}"
     DIST_DIR.mkdir(exist_ok=True)
     
-    with tarfile.open(tar_output, 'w:gz') as tar:
-        tar.add(TEMP_BUILD_DIR, arcname='.')
+    with open_package_tar(tar_output) as tar:
+        add_dir_to_tar(tar, TEMP_BUILD_DIR)
+        image_size = add_docker_save_to_tar(
+            tar, ["capacity-report-app:latest"], "./images/capacity-app-update"
+        )
+    print_info(f"镜像导出完成: {format_size(image_size)}")
     
     print_info(f"更新包已生成: {tar_output}")
     print_info(f"文件大小: {format_size(tar_output.stat().st_size)}")
     
     # 清理临时文件和缓存
-    print_step("清理临时文件...")
-    if TEMP_BUILD_DIR.exists():
-        shutil.rmtree(TEMP_BUILD_DIR, ignore_errors=True)
-        print_info("已清理临时构建目录")
+    cleanup_temp_build_dir()
     
     return tar_output
 
@@ -963,8 +1278,8 @@ def main():
         print(f"部署包位置: {tar_file}")
         print()
         print("使用方法:")
-        print("1. 将 tar.gz 文件传输到目标 Linux 机器")
-        print("2. 解压: tar -xzf capacity-report-full.tar.gz")
+        print(f"1. 将 {tar_file.name} 传输到目标 Linux 机器")
+        print(f"2. 解压: {get_extract_cmd(tar_file)}")
         print("3. 进入解压目录，执行: sh deploy.sh")
         print()
     else:
@@ -977,8 +1292,8 @@ def main():
         print(f"更新包位置: {tar_file}")
         print()
         print("使用方法:")
-        print("1. 将 tar.gz 文件传输到目标 Linux 机器")
-        print("2. 解压: tar -xzf capacity-report-update.tar.gz")
+        print(f"1. 将 {tar_file.name} 传输到目标 Linux 机器")
+        print(f"2. 解压: {get_extract_cmd(tar_file)}")
         print("3. 进入解压目录，执行: sh update.sh")
         print()
         print("注意: 更新包仅用于更新已部署的应用，不包含 MySQL")